@@ -1,11 +1,23 @@
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
 from rest_framework.mixins import (
     CreateModelMixin,
     DestroyModelMixin,
     ListModelMixin,
     RetrieveModelMixin,
 )
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from core.cache import make_response_key, record_cache_event
+
 
 class ListRetriveViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin):
     pass
@@ -15,3 +27,68 @@ class CreateDestroyListViewSet(
     GenericViewSet, CreateModelMixin, DestroyModelMixin, ListModelMixin
 ):
     pass
+
+
+class AnonymousCacheMixin:
+    """Cache list and retrieve responses served to anonymous users"""
+
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+        key = make_response_key(
+            namespace=self.cache_namespace, request=request
+        )
+        data = cache.get(key)
+        if data is not None:
+            record_cache_event(namespace=self.cache_namespace, event="hit")
+            return Response(data)
+        record_cache_event(namespace=self.cache_namespace, event="miss")
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+
+class CatalogSnapshotMixin:
+    """Serve the unfiltered list from an in-process snapshot with an ETag"""
+
+    snapshot = None
+    gzip_re = re.compile(r"\bgzip\b")
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != "json":
+            return super().list(request, *args, **kwargs)
+        content, compressed, etag = self.snapshot.get(
+            render=self.render_snapshot
+        )
+        gzipped = self.gzip_re.search(
+            request.headers.get("Accept-Encoding", "")
+        )
+        if gzipped:
+            # Strong ETags must differ between the encoded representations.
+            content, etag = compressed, f'{etag[:-1]}-gzip"'
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                content, content_type=JSONRenderer.media_type
+            )
+            if gzipped:
+                response["Content-Encoding"] = "gzip"
+        response["ETag"] = etag
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+    def render_snapshot(self):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return JSONRenderer().render(serializer.data)
@@ -1,12 +1,20 @@
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from django.db import transaction
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
 from app.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
-from core.serializers import Base64ImageField
-from users.models import Subscription
+from app.signals import recipe_ingredients_changed
+from cart.models import CartIngredient
+from core.cache import get_following_ids
+from core.images import schedule_renditions
+from core.serializers import (
+    Base64ImageField,
+    BulkPrimaryKeyRelatedField,
+    get_in_bulk,
+)
 
 User = get_user_model()
 
@@ -28,11 +36,13 @@ class UserMeSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         user = self.context["request"].user
         return (
             False
             if user.is_anonymous
-            else Subscription.objects.filter(user=user, author=obj).exists()
+            else obj.id in get_following_ids(user=user)
         )
 
 
@@ -54,11 +64,13 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         user = self.context["request"].user
         return (
             False
             if user.is_anonymous
-            else Subscription.objects.filter(user=user, author=obj).exists()
+            else obj.id in get_following_ids(user=user)
         )
 
 
@@ -79,10 +91,27 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         model = RecipeIngredient
 
 
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    default_error_messages = {
+        "incorrect_type": "Неверный тип идентификатора ингредиента",
+        "does_not_exist": "Ингредиента с id={pk_value} не существует",
+    }
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = get_in_bulk(
+            Ingredient.objects.all(),
+            [item.pop("ingredient_id") for item in items],
+            self.fail,
+        )
+        for item, ingredient in zip(items, ingredients):
+            item["ingredient"] = ingredient
+        return items
+
+
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        source="ingredient", queryset=Ingredient.objects.all()
-    )
+    # Resolved for the whole list at once by RecipeIngredientListSerializer.
+    id = serializers.IntegerField(source="ingredient_id")
 
     class Meta:
         fields = (
@@ -90,6 +119,7 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
             "amount",
         )
         model = RecipeIngredient
+        list_serializer_class = RecipeIngredientListSerializer
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -124,6 +154,10 @@ class RecipeSerializer(serializers.ModelSerializer):
         read_only=True,
     )
     image = Base64ImageField(allow_null=False, read_only=True)
+    image_renditions = serializers.SerializerMethodField(
+        method_name="get_image_renditions",
+        read_only=True,
+    )
 
     class Meta:
         fields = (
@@ -135,6 +169,8 @@ class RecipeSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_renditions",
+            "favorites_count",
             "text",
             "cooking_time",
         )
@@ -145,7 +181,14 @@ class RecipeSerializer(serializers.ModelSerializer):
             ),
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, "is_author_subscribed"):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
         user = self.context["request"].user
         return (
             False
@@ -153,7 +196,23 @@ class RecipeSerializer(serializers.ModelSerializer):
             else obj.favorites.filter(user=user).exists()
         )
 
+    def get_image_renditions(self, obj):
+        request = self.context.get("request")
+        return {
+            rendition: {
+                extension: (
+                    request.build_absolute_uri(default_storage.url(name))
+                    if request
+                    else default_storage.url(name)
+                )
+                for extension, name in files.items()
+            }
+            for rendition, files in obj.image_renditions.items()
+        }
+
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
         user = self.context["request"].user
         return (
             False
@@ -169,9 +228,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         required=True,
         allow_null=False,
     )
-    tags = serializers.SlugRelatedField(
-        slug_field="id", queryset=Tag.objects.all(), many=True
-    )
+    tags = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
     image = Base64ImageField(allow_null=False)
 
     class Meta:
@@ -187,18 +244,76 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def _create_links(recipe, tags, ingredients):
-        for tag in tags:
-            current_tag = Tag.objects.get(id=tag.id)
-            RecipeTag.objects.create(recipe=recipe, tag=current_tag)
-        for ingredient in ingredients:
-            current_ingredient = Ingredient.objects.get(
-                name=ingredient["ingredient"].name
-            )
-            RecipeIngredient.objects.create(
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag) for tag in tags
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
                 recipe=recipe,
-                ingredient=current_ingredient,
+                ingredient=ingredient["ingredient"],
                 amount=ingredient["amount"],
             )
+            for ingredient in ingredients
+        )
+        recipe_ingredients_changed.send(
+            sender=Recipe,
+            recipe=recipe,
+            old={},
+            new={
+                ingredient["ingredient"].id: ingredient["amount"]
+                for ingredient in ingredients
+            },
+        )
+        return recipe
+
+    @staticmethod
+    def _update_links(recipe, tags, ingredients):
+        current_tags = set(
+            recipe.recipetag_set.values_list("tag_id", flat=True)
+        )
+        new_tags = {tag.id for tag in tags}
+        if current_tags - new_tags:
+            recipe.recipetag_set.filter(
+                tag_id__in=current_tags - new_tags
+            ).delete()
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=tag_id)
+            for tag_id in new_tags - current_tags
+        )
+        current_ingredients = {
+            link.ingredient_id: link
+            for link in recipe.recipeingredient_set.all()
+        }
+        old_amounts = {
+            ingredient_id: link.amount
+            for ingredient_id, link in current_ingredients.items()
+        }
+        new_ingredients = {
+            ingredient["ingredient"].id: ingredient["amount"]
+            for ingredient in ingredients
+        }
+        removed = current_ingredients.keys() - new_ingredients.keys()
+        if removed:
+            recipe.recipeingredient_set.filter(
+                ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, link in current_ingredients.items():
+            amount = new_ingredients.get(ingredient_id, link.amount)
+            if amount != link.amount:
+                link.amount = amount
+                changed.append(link)
+        RecipeIngredient.objects.bulk_update(changed, ("amount",))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new_ingredients.items()
+            if ingredient_id not in current_ingredients
+        )
+        recipe_ingredients_changed.send(
+            sender=Recipe, recipe=recipe, old=old_amounts, new=new_ingredients
+        )
         return recipe
 
     @staticmethod
@@ -215,21 +330,25 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             _validated_data,
         ) = self._get_tags_and_recipeingridients(validated_data=validated_data)
         recipe = Recipe.objects.create(**_validated_data)
+        schedule_renditions(recipe)
         return self._create_links(
             recipe=recipe, tags=tags, ingredients=recipeingredients
         )
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        instance.recipetag_set.all().delete()
-        instance.recipeingredient_set.all().delete()
         (
             tags,
             recipeingredients,
             _validated_data,
         ) = self._get_tags_and_recipeingridients(validated_data=validated_data)
+        image = instance.image.name
         super().update(instance=instance, validated_data=_validated_data)
-        return self._create_links(
+        if instance.image.name != image:
+            instance.image_renditions = {}
+            Recipe.objects.filter(pk=instance.pk).update(image_renditions={})
+            schedule_renditions(instance)
+        return self._update_links(
             recipe=instance, tags=tags, ingredients=recipeingredients
         )
 
@@ -268,10 +387,6 @@ class UserSubscriptionSerializer(serializers.ModelSerializer):
         read_only=True,
     )
     recipes = UserRecipeSerializer(many=True)
-    recipes_count = serializers.SerializerMethodField(
-        method_name="get_recipes_count",
-        read_only=True,
-    )
 
     class Meta:
         fields = (
@@ -287,11 +402,27 @@ class UserSubscriptionSerializer(serializers.ModelSerializer):
         model = User
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         user = self.context["request"].user
-        return Subscription.objects.filter(user=user, author=obj).exists()
+        return obj.id in get_following_ids(user=user)
+
+
+class ShoppingListSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source="ingredient.id")
+    name = serializers.ReadOnlyField(source="ingredient.name")
+    measurement_unit = serializers.ReadOnlyField(
+        source="ingredient.measurement_unit"
+    )
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.all().count()
+    class Meta:
+        fields = (
+            "id",
+            "name",
+            "measurement_unit",
+            "amount",
+        )
+        model = CartIngredient
 
 
 class FavoriteRecipeSerializer(serializers.ModelSerializer):
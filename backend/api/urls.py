@@ -6,6 +6,7 @@ from .views import (
     IngredientViewSet,
     RecipeViewSet,
     TagViewSet,
+    metrics,
 )
 
 app_name = "api"
@@ -20,4 +21,5 @@ api_router.register("users", CustomUserViewSet, basename="users")
 urlpatterns = [
     path("", include(api_router.urls)),
     path("auth/", include("djoser.urls.authtoken")),
+    path("metrics/", metrics, name="metrics"),
 ]
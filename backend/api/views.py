@@ -1,4 +1,17 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import (
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Value,
+    Window,
+    prefetch_related_objects,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.http import Http404, HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status
@@ -9,20 +22,33 @@ from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from .mixins import ListRetriveViewSet
+from .mixins import (
+    AnonymousCacheMixin,
+    CatalogSnapshotMixin,
+    ListRetriveViewSet,
+)
 from .serializers import (
     FavoriteRecipeSerializer,
     IngredientSerializer,
     RecipeCreateSerializer,
     RecipeSerializer,
+    ShoppingListSerializer,
     TagSerializer,
     UserRecipeSerializer,
     UserSubscriptionSerializer,
 )
-from app.models import FavoriteRecipe, Ingredient, Recipe, Tag
-from cart.models import Cart, CartItem
+from app.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Tag,
+)
+from cart.models import Cart, CartIngredient, CartItem
+from core.cache import CatalogSnapshot
 from core.filters import IngredientFilter, RecipeFilter
 from core.generics import get_object_or_400, get_pdf
+from core.metrics import registry
 from core.pagination import RecipePagination
 from core.permissions import IsAuthorIsAuthenticatedOrReadOnly
 from users.models import Subscription
@@ -30,27 +56,58 @@ from users.models import Subscription
 User = get_user_model()
 
 
-class TagViewSet(ListRetriveViewSet):
+class TagViewSet(CatalogSnapshotMixin, ListRetriveViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    snapshot = CatalogSnapshot(namespace="tags")
 
 
-class IngredientViewSet(ListRetriveViewSet):
+class IngredientViewSet(CatalogSnapshotMixin, ListRetriveViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filterset_class = IngredientFilter
+    snapshot = CatalogSnapshot(namespace="ingredients")
 
 
-class RecipeViewSet(ModelViewSet):
-    queryset = Recipe.objects.all()
+class RecipeViewSet(AnonymousCacheMixin, ModelViewSet):
     lookup_field = "id"
+    cache_namespace = "recipes"
     pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = (IsAuthorIsAuthenticatedOrReadOnly,)
 
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Recipe.objects.select_related("author").prefetch_related(
+            Prefetch("tags", queryset=Tag.objects.all()),
+            Prefetch(
+                "recipeingredient_set",
+                queryset=RecipeIngredient.objects.select_related("ingredient"),
+            ),
+        )
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                is_author_subscribed=Value(False),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(
+                FavoriteRecipe.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                CartItem.objects.filter(cart__user=user, recipe=OuterRef("pk"))
+            ),
+            is_author_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user, author=OuterRef("author")
+                )
+            ),
+        )
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeSerializer
@@ -66,12 +123,11 @@ class RecipeViewSet(ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
-        headers = self.get_success_headers(serializer.data)
-        _serializer = RecipeSerializer(
-            instance=serializer.instance, context={"request": request}
-        )
+        data = self.get_written_recipe(serializer.instance)
         return Response(
-            _serializer.data, status=status.HTTP_201_CREATED, headers=headers
+            data,
+            status=status.HTTP_201_CREATED,
+            headers=self.get_success_headers(data),
         )
 
     def update(self, request, *args, **kwargs):
@@ -82,10 +138,17 @@ class RecipeViewSet(ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
-        _serializer = RecipeSerializer(
-            instance=serializer.instance, context={"request": request}
+        return Response(
+            self.get_written_recipe(serializer.instance),
+            status=status.HTTP_200_OK,
         )
-        return Response(_serializer.data, status=status.HTTP_200_OK)
+
+    def get_written_recipe(self, recipe):
+        """Reload the saved recipe with the list prefetches and annotations"""
+        return RecipeSerializer(
+            instance=self.get_queryset().get(pk=recipe.pk),
+            context=self.get_serializer_context(),
+        ).data
 
     @action(
         methods=(
@@ -144,27 +207,107 @@ class RecipeViewSet(ModelViewSet):
         cart_item.delete()
         return Response(data=None, status=status.HTTP_204_NO_CONTENT)
 
+    @action(methods=("get",), detail=False)
+    def trending(self, request, *args, **kwargs):
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .filter(trending__isnull=False)
+            .order_by("-trending__score", "-id")
+        )
+        serializer = RecipeSerializer(
+            queryset[: settings.TRENDING_LIMIT],
+            many=True,
+            context={"request": request},
+        )
+        return Response(serializer.data)
+
+    @action(
+        methods=("get",), detail=False, permission_classes=(IsAuthenticated,)
+    )
+    def shopping_list(self, request, *args, **kwargs):
+        cart, created = Cart.objects.get_or_create(user=self.request.user)
+        queryset = (
+            CartIngredient.objects.filter(cart=cart)
+            .select_related("ingredient")
+            .order_by("ingredient__name")
+        )
+        serializer = ShoppingListSerializer(queryset, many=True)
+        return Response(serializer.data)
+
     @action(
         methods=("get",), detail=False, permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request, *args, **kwargs):
         user = self.request.user
-        cart = user.cart
+        cart, created = Cart.objects.get_or_create(user=user)
         return get_pdf(user=user, cart=cart)
 
 
 class CustomUserViewSet(UserViewSet):
     pagination_class = LimitOffsetPagination
 
+    def get_queryset(self):
+        user = self.request.user
+        queryset = super().get_queryset()
+        if user.is_anonymous:
+            return queryset
+        return queryset.annotate(
+            is_subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef("pk"))
+            )
+        )
+
+    def get_subscriptions_queryset(self):
+        return (
+            User.objects.filter(subscription__user=self.request.user)
+            .annotate(is_subscribed=Value(True))
+            .order_by("id")
+        )
+
+    def prefetch_latest_recipes(self, authors):
+        """Prefetch recipes of the authors, recipes_limit newest per author"""
+        if not authors:
+            # An empty author__in cannot be compiled into the window query.
+            return authors
+        recipes = Recipe.objects.order_by("-created_at", "-id")
+        try:
+            recipes_limit = int(self.request.query_params["recipes_limit"])
+        except (KeyError, ValueError):
+            recipes_limit = None
+        if recipes_limit is not None:
+            ranked = (
+                Recipe.objects.filter(author__in=authors)
+                .annotate(
+                    recipe_rank=Window(
+                        RowNumber(),
+                        partition_by=F("author"),
+                        order_by=(F("created_at").desc(), F("id").desc()),
+                    )
+                )
+                .values("id", "recipe_rank")
+            )
+            sql, params = ranked.query.sql_with_params()
+            recipes = recipes.filter(
+                pk__in=RawSQL(
+                    f"SELECT id FROM ({sql}) ranked WHERE recipe_rank <= %s",
+                    (*params, max(recipes_limit, 0)),
+                )
+            )
+        prefetch_related_objects(
+            authors, Prefetch("recipes", queryset=recipes)
+        )
+        return authors
+
     @action(
         methods=("get",),
         detail=False,
         permission_classes=(IsAuthenticated,),
     )
     def subscriptions(self, request, *args, **kwargs):
-        user = self.request.user
-        queryset = User.objects.filter(subscription__user=user)
-        paginated_queryset = self.paginate_queryset(queryset=queryset)
+        queryset = self.get_subscriptions_queryset()
+        paginated_queryset = self.prefetch_latest_recipes(
+            authors=self.paginate_queryset(queryset=queryset)
+        )
         serializer = UserSubscriptionSerializer(
             paginated_queryset, many=True, context={"request": request}
         )
@@ -196,7 +339,8 @@ class CustomUserViewSet(UserViewSet):
                     {"errors": "Вы уже подписаны на этого автора"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            queryset = User.objects.get(id=author.id)
+            queryset = self.get_subscriptions_queryset().get(id=author.id)
+            self.prefetch_latest_recipes(authors=(queryset,))
             serializer = UserSubscriptionSerializer(
                 queryset, context={"request": request}
             )
@@ -206,3 +350,11 @@ class CustomUserViewSet(UserViewSet):
         )
         subscription.delete()
         return Response(data=None, status=status.HTTP_204_NO_CONTENT)
+
+
+def metrics(request):
+    if not settings.SERVER_TIMING_ENABLED:
+        raise Http404
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4"
+    )
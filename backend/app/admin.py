@@ -32,14 +32,15 @@ class IngredientModelsAdmin(admin.ModelAdmin):
 
 
 class RecipeModelsAdmin(admin.ModelAdmin):
-    readonly_fields = ("times_in_favorite",)
-    list_display = ("name", "author")
+    readonly_fields = ("times_in_favorite", "cart_count")
+    list_display = ("name", "author", "favorites_count")
     search_fields = ("name", "author")
     list_filter = ("name", "author", "tags__name")
     inlines = (RecipeTagInLine, RecipeIngredientInLine)
 
+    @admin.display(description="В избранном")
     def times_in_favorite(self, obj):
-        return FavoriteRecipe.objects.filter(recipe=obj.id).count()
+        return obj.favorites_count
 
 
 class FavoriteRecipeModelsAdmin(admin.ModelAdmin):
@@ -2,9 +2,12 @@ import textwrap
 
 from django.conf import settings
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from pytils.translit import slugify
 
+from core.search import normalize_search_text
+
 
 class Tag(models.Model):
     name = models.CharField(
@@ -62,12 +65,17 @@ class Ingredient(models.Model):
         verbose_name="Название ингридиента",
         max_length=200,
         unique=False,
-        db_index=True,
     )
     measurement_unit = models.CharField(
         verbose_name="Единица измерения",
         max_length=50,
     )
+    search_name = models.CharField(
+        verbose_name="Название для поиска",
+        max_length=200,
+        default="",
+        editable=False,
+    )
 
     class Meta:
         verbose_name = "Ингридиент"
@@ -83,6 +91,10 @@ class Ingredient(models.Model):
             ),
         ]
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_search_text(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return textwrap.shorten(
             text=self.name,
@@ -123,6 +135,7 @@ class Recipe(models.Model):
         settings.AUTH_USER_MODEL,
         related_name="recipes",
         on_delete=models.CASCADE,
+        db_index=False,
     )
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -135,11 +148,37 @@ class Recipe(models.Model):
         upload_to="images/",
         default=None,
     )
+    image_renditions = models.JSONField(
+        verbose_name="Уменьшенные копии изображения",
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="В избранном", default=0, editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        verbose_name="В корзинах", default=0, editable=False
+    )
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ["-created_at"]
+        # The author index leads with author_id, so the FK needs no other.
+        indexes = [
+            models.Index(
+                fields=["-created_at", "id"], name="recipe_created_at_idx"
+            ),
+            models.Index(
+                fields=["author", "-created_at"],
+                name="recipe_author_created_at_idx",
+            ),
+            models.Index(
+                fields=["-favorites_count", "-id"],
+                name="recipe_favorites_count_idx",
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=["name", "author"], name="unique_recipes_for_author"
@@ -220,11 +259,16 @@ class FavoriteRecipe(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Рецепт",
     )
+    created_at = models.DateTimeField(
+        verbose_name="Дата добавления",
+        default=timezone.now,
+        editable=False,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = "Избранный рецепт"
         verbose_name_plural = "Избранные рецепты"
-        ordering = ("user",)
         constraints = [
             models.UniqueConstraint(
                 fields=(
@@ -240,3 +284,136 @@ class FavoriteRecipe(models.Model):
             f"Избранный рецепт {self.recipe.name} "
             f"пользователя {self.user.get_full_name()}"
         )
+
+
+class CatalogImport(models.Model):
+    source = models.CharField(
+        verbose_name="Файл импорта", max_length=255, unique=True
+    )
+    file_checksum = models.CharField(
+        verbose_name="Контрольная сумма файла", max_length=64
+    )
+    rows = models.PositiveIntegerField(
+        verbose_name="Загружено записей", default=0
+    )
+    rows_checksum = models.CharField(
+        verbose_name="Контрольная сумма загруженных записей", max_length=64
+    )
+    updated_at = models.DateTimeField(
+        verbose_name="Дата загрузки", auto_now=True
+    )
+
+    class Meta:
+        verbose_name = "Импорт справочника"
+        verbose_name_plural = "Импорт справочников"
+
+    def __str__(self):
+        return f"{self.source}: {self.rows}"
+
+
+class TrendingRecipeManager(models.Manager):
+    def refresh(self, now=None):
+        """Decay stored scores and fold in events since the watermark
+
+        Events newer than TRENDING_LAG are left for the next run, so rows
+        from transactions still in flight are not skipped.
+        """
+        from cart.models import CartItem
+
+        now = now or timezone.now()
+        until = now - settings.TRENDING_LAG
+        half_life = settings.TRENDING_HALF_LIFE.total_seconds()
+        with transaction.atomic():
+            (
+                state,
+                _,
+            ) = TrendingRefresh.objects.select_for_update().get_or_create(
+                pk=1,
+                defaults={
+                    "watermark": until - settings.TRENDING_WINDOW,
+                    "refreshed_at": now,
+                },
+            )
+            if until <= state.watermark:
+                return 0
+            factor = 0.5 ** (
+                (now - state.refreshed_at).total_seconds() / half_life
+            )
+            self.update(score=models.F("score") * factor)
+            scores = {}
+            for model, weight in (
+                (FavoriteRecipe, settings.TRENDING_FAVORITE_WEIGHT),
+                (CartItem, settings.TRENDING_CART_WEIGHT),
+            ):
+                events = model.objects.filter(
+                    created_at__gt=state.watermark, created_at__lte=until
+                ).values_list("recipe_id", "created_at")
+                for recipe_id, created_at in events.iterator():
+                    age = (now - created_at).total_seconds()
+                    scores[recipe_id] = scores.get(recipe_id, 0) + weight * (
+                        0.5 ** (age / half_life)
+                    )
+            self.add_scores(scores, now)
+            self.filter(score__lt=settings.TRENDING_MIN_SCORE).delete()
+            state.watermark = until
+            state.refreshed_at = now
+            state.save()
+        return len(scores)
+
+    def add_scores(self, scores, now):
+        existing = self.in_bulk(scores.keys())
+        for recipe_id, trending in existing.items():
+            trending.score += scores[recipe_id]
+            trending.updated_at = now
+        self.bulk_update(existing.values(), ("score", "updated_at"))
+        recipe_ids = set(
+            Recipe.objects.filter(
+                pk__in=scores.keys() - existing.keys()
+            ).values_list("pk", flat=True)
+        )
+        self.bulk_create(
+            TrendingRecipe(
+                recipe_id=recipe_id, score=scores[recipe_id], updated_at=now
+            )
+            for recipe_id in recipe_ids
+        )
+
+
+class TrendingRecipe(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="trending",
+        verbose_name="Рецепт",
+    )
+    score = models.FloatField(verbose_name="Популярность", default=0)
+    updated_at = models.DateTimeField(verbose_name="Дата обновления")
+
+    objects = TrendingRecipeManager()
+
+    class Meta:
+        verbose_name = "Популярный рецепт"
+        verbose_name_plural = "Популярные рецепты"
+        indexes = [
+            models.Index(fields=["-score"], name="trending_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe}: {self.score:.2f}"
+
+
+class TrendingRefresh(models.Model):
+    watermark = models.DateTimeField(
+        verbose_name="Учтены события до", default=timezone.now
+    )
+    refreshed_at = models.DateTimeField(
+        verbose_name="Дата пересчёта", default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = "Пересчёт популярных рецептов"
+        verbose_name_plural = "Пересчёты популярных рецептов"
+
+    def __str__(self):
+        return f"{self.watermark:%Y-%m-%d %H:%M}"
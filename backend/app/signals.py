@@ -0,0 +1,221 @@
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from .models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+)
+from core.cache import bump_version
+from core.ingredient_index import ingredient_index
+from core.search import RECIPE_FTS_TABLE, normalize_search_text
+
+# Sent with recipe, old and new ({ingredient_id: amount}) whenever the
+# ingredient links of a recipe change. Single links saved or deleted
+# through the model send it from the handlers below. bulk_create(),
+# bulk_update() and QuerySet.delete() callers send it themselves.
+recipe_ingredients_changed = Signal()
+
+POSTGRES_SEARCH_INDEXES = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS app_ingredient_search_prefix_idx "
+    "ON {ingredient} (search_name varchar_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS app_ingredient_search_trgm_idx "
+    "ON {ingredient} USING gin (search_name gin_trgm_ops)",
+    "ALTER TABLE {recipe} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS app_recipe_search_vector_idx "
+    "ON {recipe} USING gin (search_vector)",
+)
+
+# FTS5 folds case but not "ё", so the indexed values are folded by hand.
+SQLITE_FOLD = (
+    "replace(replace({0}.name, 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace({0}.text, 'ё', 'е'), 'Ё', 'Е')"
+)
+SQLITE_NEW = SQLITE_FOLD.format("new")
+SQLITE_OLD = SQLITE_FOLD.format("old")
+SQLITE_SEARCH_INDEXES = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+    "name, text, content='{recipe}', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {recipe} "
+    "BEGIN INSERT INTO {fts}(rowid, name, text) "
+    f"VALUES (new.id, {SQLITE_NEW}); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {recipe} "
+    "BEGIN INSERT INTO {fts}({fts}, rowid, name, text) "
+    f"VALUES ('delete', old.id, {SQLITE_OLD}); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_update "
+    "AFTER UPDATE OF name, text ON {recipe} "
+    "BEGIN INSERT INTO {fts}({fts}, rowid, name, text) "
+    f"VALUES ('delete', old.id, {SQLITE_OLD}); "
+    "INSERT INTO {fts}(rowid, name, text) "
+    f"VALUES (new.id, {SQLITE_NEW}); END",
+    "INSERT INTO {fts}({fts}) VALUES ('delete-all')",
+    "INSERT INTO {fts}(rowid, name, text) "
+    f"SELECT id, {SQLITE_FOLD.format('{recipe}')} FROM {{recipe}}",
+)
+
+
+def deleted_with_recipe(origin):
+    """Whether the row goes away because its recipe is being deleted
+
+    Such cascades are handled once per recipe instead of once per row.
+    """
+    return (
+        isinstance(origin, Recipe) or getattr(origin, "model", None) is Recipe
+    )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeTag)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_recipe_cache(sender, **kwargs):
+    bump_version(namespace="recipes")
+
+
+@receiver(recipe_ingredients_changed, sender=Recipe)
+def update_ingredient_index(sender, recipe, old, new, **kwargs):
+    ingredient_index.publish(
+        recipe.pk,
+        removed=old.keys() - new.keys(),
+        added=new.keys() - old.keys(),
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def drop_from_ingredient_index(sender, instance, **kwargs):
+    ingredient_index.publish(instance.pk, removed=None)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def remove_from_ingredient_index(sender, instance, origin=None, **kwargs):
+    # Single links are published through recipe_ingredients_changed and
+    # recipe cascades by the Recipe handler above.
+    if not isinstance(origin, RecipeIngredient) and not deleted_with_recipe(
+        origin
+    ):
+        ingredient_index.publish(
+            instance.recipe_id, removed=[instance.ingredient_id]
+        )
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_link_amount(sender, instance, raw=False, **kwargs):
+    instance.saved_amounts = (
+        {}
+        if raw or instance._state.adding
+        else dict(
+            RecipeIngredient.objects.filter(pk=instance.pk).values_list(
+                "ingredient_id", "amount"
+            )
+        )
+    )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def send_link_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    recipe_ingredients_changed.send(
+        sender=Recipe,
+        recipe=instance.recipe,
+        old=getattr(instance, "saved_amounts", {}),
+        new={instance.ingredient_id: instance.amount},
+    )
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def send_link_deleted(sender, instance, origin=None, **kwargs):
+    # Links deleted with their recipe leave the carts through the CartItem
+    # cascade, and QuerySet.delete() callers send the signal themselves.
+    if isinstance(origin, RecipeIngredient):
+        recipe_ingredients_changed.send(
+            sender=Recipe,
+            recipe=instance.recipe,
+            old={instance.ingredient_id: instance.amount},
+            new={},
+        )
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_cache(sender, **kwargs):
+    bump_version(namespace="tags")
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_cache(sender, **kwargs):
+    bump_version(namespace="ingredients")
+
+
+# Counters are updated from signals that Django sends inside the atomic
+# blocks of get_or_create, serializer create and Model.delete, so they
+# commit or roll back together with the row that changed them. Decrements
+# stop at zero: rows that existed before the columns were added start at 0
+# until reconcilecounters runs (RECONCILE_COUNTERS=True in start.sh).
+@receiver(post_save, sender=FavoriteRecipe)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            favorites_count=F("favorites_count") + 1
+        )
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+def decrement_favorites_count(sender, instance, origin=None, **kwargs):
+    if deleted_with_recipe(origin):
+        return
+    Recipe.objects.filter(pk=instance.recipe_id, favorites_count__gt=0).update(
+        favorites_count=F("favorites_count") - 1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        get_user_model().objects.filter(pk=instance.author_id).update(
+            recipes_count=F("recipes_count") + 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    get_user_model().objects.filter(
+        pk=instance.author_id, recipes_count__gt=0
+    ).update(recipes_count=F("recipes_count") - 1)
+
+
+def create_search_indexes(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Backfill search columns and add the indexes migrations can't express"""
+    ingredients = list(
+        Ingredient.objects.using(using).filter(search_name="").only("name")
+    )
+    for ingredient in ingredients:
+        ingredient.search_name = normalize_search_text(ingredient.name)
+    Ingredient.objects.using(using).bulk_update(
+        ingredients, ("search_name",), batch_size=1000
+    )
+    connection = connections[using]
+    statements = {
+        "postgresql": POSTGRES_SEARCH_INDEXES,
+        "sqlite": SQLITE_SEARCH_INDEXES,
+    }.get(connection.vendor, ())
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(
+                sql.format(
+                    ingredient=Ingredient._meta.db_table,
+                    recipe=Recipe._meta.db_table,
+                    fts=RECIPE_FTS_TABLE,
+                )
+            )
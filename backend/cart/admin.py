@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Cart, CartItem
+from .models import Cart, CartIngredient, CartItem
 
 
 class CartModelsAdmin(admin.ModelAdmin):
@@ -13,5 +13,11 @@ class CartItemModelsAdmin(admin.ModelAdmin):
     list_filter = ("cart",)
 
 
+class CartIngredientModelsAdmin(admin.ModelAdmin):
+    list_display = ("cart", "ingredient", "amount")
+    list_filter = ("cart",)
+
+
 admin.site.register(Cart, CartModelsAdmin)
 admin.site.register(CartItem, CartItemModelsAdmin)
+admin.site.register(CartIngredient, CartIngredientModelsAdmin)
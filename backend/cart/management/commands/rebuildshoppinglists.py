@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from cart.models import Cart, CartIngredient
+
+
+class Command(BaseCommand):
+    help = "Пересчёт списков покупок по содержимому корзин"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        cart_ids = list(Cart.objects.values_list("id", flat=True))
+        for start in range(0, len(cart_ids), batch_size):
+            CartIngredient.objects.rebuild(
+                cart_ids=cart_ids[start : start + batch_size]
+            )
+        self.stdout.write(f"shopping lists rebuilt: {len(cart_ids)}")
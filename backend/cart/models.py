@@ -1,7 +1,10 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Sum
+from django.utils import timezone
 
-from app.models import Recipe
+from app.models import Ingredient, Recipe, RecipeIngredient
+from core.cache import bump_version
 
 
 class Cart(models.Model):
@@ -37,11 +40,16 @@ class CartItem(models.Model):
         null=False,
         related_name="cart_items",
     )
+    created_at = models.DateTimeField(
+        verbose_name="Дата добавления",
+        default=timezone.now,
+        editable=False,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = "Рецепт корзины"
         verbose_name_plural = "Рецепты корзины"
-        ordering = ["cart"]
         constraints = [
             models.UniqueConstraint(
                 fields=["cart", "recipe"], name="unique_recipe_for_cart"
@@ -53,3 +61,120 @@ class CartItem(models.Model):
             f"Рецепт {self.recipe} в корзине "
             f"пользователя {self.cart.user.username}"
         )
+
+
+class CartIngredientManager(models.Manager):
+    def add_recipe(self, cart_id, recipe_id, sign=1):
+        amounts = RecipeIngredient.objects.filter(
+            recipe_id=recipe_id
+        ).values_list("ingredient_id", "amount")
+        self.apply_changes(
+            cart_ids=(cart_id,),
+            changes={
+                ingredient_id: sign * amount
+                for ingredient_id, amount in amounts
+            },
+        )
+
+    def remove_recipe(self, cart_id, recipe_id):
+        self.add_recipe(cart_id=cart_id, recipe_id=recipe_id, sign=-1)
+
+    def change_recipe(self, recipe_id, old, new):
+        changes = {
+            ingredient_id: new.get(ingredient_id, 0)
+            - old.get(ingredient_id, 0)
+            for ingredient_id in old.keys() | new.keys()
+        }
+        cart_ids = CartItem.objects.filter(recipe_id=recipe_id).values_list(
+            "cart_id", flat=True
+        )
+        self.apply_changes(cart_ids=list(cart_ids), changes=changes)
+
+    def apply_changes(self, cart_ids, changes):
+        """Add amount deltas {ingredient_id: delta} to every given cart"""
+        changes = {key: value for key, value in changes.items() if value}
+        if not cart_ids or not changes:
+            return
+        with transaction.atomic():
+            existing = {
+                (total.cart_id, total.ingredient_id): total
+                for total in self.select_for_update().filter(
+                    cart_id__in=cart_ids, ingredient_id__in=changes
+                )
+            }
+            created, updated, removed = [], [], []
+            for cart_id in cart_ids:
+                for ingredient_id, delta in changes.items():
+                    total = existing.get((cart_id, ingredient_id))
+                    if total is None:
+                        if delta > 0:
+                            created.append(
+                                self.model(
+                                    cart_id=cart_id,
+                                    ingredient_id=ingredient_id,
+                                    amount=delta,
+                                )
+                            )
+                        continue
+                    total.amount += delta
+                    if total.amount > 0:
+                        updated.append(total)
+                    else:
+                        removed.append(total.pk)
+            if removed:
+                self.filter(pk__in=removed).delete()
+            self.bulk_update(updated, ("amount",))
+            self.bulk_create(created)
+        for cart_id in cart_ids:
+            bump_version(namespace=f"cart:{cart_id}")
+
+    def rebuild(self, cart_ids):
+        totals = (
+            RecipeIngredient.objects.filter(
+                recipe__cart_items__cart_id__in=cart_ids
+            )
+            .values("recipe__cart_items__cart_id", "ingredient_id")
+            .annotate(total=Sum("amount"))
+            .order_by()
+        )
+        with transaction.atomic():
+            self.filter(cart_id__in=cart_ids).delete()
+            self.bulk_create(
+                self.model(
+                    cart_id=total["recipe__cart_items__cart_id"],
+                    ingredient_id=total["ingredient_id"],
+                    amount=total["total"],
+                )
+                for total in totals
+            )
+        for cart_id in cart_ids:
+            bump_version(namespace=f"cart:{cart_id}")
+
+
+class CartIngredient(models.Model):
+    cart = models.ForeignKey(
+        Cart,
+        on_delete=models.CASCADE,
+        related_name="ingredient_totals",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="cart_totals",
+    )
+    amount = models.PositiveIntegerField(verbose_name="Количество")
+
+    objects = CartIngredientManager()
+
+    class Meta:
+        verbose_name = "Ингридиент корзины"
+        verbose_name_plural = "Ингридиенты корзины"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "ingredient"],
+                name="unique_ingredient_for_cart",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.ingredient} в корзине {self.cart_id}: {self.amount}"
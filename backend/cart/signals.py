@@ -0,0 +1,64 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import CartIngredient, CartItem
+from app.models import Recipe
+from app.signals import deleted_with_recipe, recipe_ingredients_changed
+from core.cache import bump_version
+
+
+@receiver(post_save, sender=CartItem)
+def add_recipe_to_totals(sender, instance, created, **kwargs):
+    if created:
+        CartIngredient.objects.add_recipe(
+            cart_id=instance.cart_id, recipe_id=instance.recipe_id
+        )
+        bump_version(namespace=f"cart:{instance.cart_id}")
+
+
+@receiver(post_save, sender=CartItem)
+def increment_cart_count(sender, instance, created, **kwargs):
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            cart_count=F("cart_count") + 1
+        )
+
+
+@receiver(post_delete, sender=CartItem)
+def decrement_cart_count(sender, instance, origin=None, **kwargs):
+    if deleted_with_recipe(origin):
+        return
+    Recipe.objects.filter(pk=instance.recipe_id, cart_count__gt=0).update(
+        cart_count=F("cart_count") - 1
+    )
+
+
+@receiver(pre_delete, sender=CartItem)
+def remove_recipe_from_totals(sender, instance, origin=None, **kwargs):
+    if deleted_with_recipe(origin):
+        return
+    CartIngredient.objects.remove_recipe(
+        cart_id=instance.cart_id, recipe_id=instance.recipe_id
+    )
+    bump_version(namespace=f"cart:{instance.cart_id}")
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe_from_totals(sender, instance, origin=None, **kwargs):
+    # One pass over every cart holding the recipe, see deleted_with_recipe.
+    if deleted_with_recipe(origin):
+        CartIngredient.objects.change_recipe(
+            recipe_id=instance.id,
+            old=dict(
+                instance.recipeingredient_set.values_list(
+                    "ingredient_id", "amount"
+                )
+            ),
+            new={},
+        )
+
+
+@receiver(recipe_ingredients_changed, sender=Recipe)
+def change_recipe_totals(sender, recipe, old, new, **kwargs):
+    CartIngredient.objects.change_recipe(recipe_id=recipe.id, old=old, new=new)
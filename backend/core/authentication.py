@@ -0,0 +1,155 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+from core.cache import (
+    bump_version,
+    get_cache_stats,
+    get_version,
+    record_cache_event,
+)
+
+AUTH_NAMESPACE = "auth:{digest}"
+
+
+def token_namespace(key):
+    """Version namespace of a token, without the token itself in the key"""
+    return AUTH_NAMESPACE.format(
+        digest=hashlib.sha256(key.encode()).hexdigest()
+    )
+
+
+class TokenCache:
+    """Bounded LRU of token key to (user, token) with a time to live
+
+    Entries remember the token's auth version and are dropped once it is
+    bumped, so logout, deactivation or a password change made in another
+    worker is seen without waiting for the TTL. That only holds when the
+    versions live in a shared cache: with a process-local one the other
+    workers keep accepting a revoked token until the TTL, which is why
+    TOKEN_CACHE_ENABLED is off by default there.
+
+    Hits and misses are added up locally and flushed to the shared cache
+    in batches, so a hit costs a single round trip for the version.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.pending = {"hit": 0, "miss": 0}
+        self.flush_at = 0
+
+    @staticmethod
+    def version(key):
+        """Read before loading the token so a concurrent revocation wins"""
+        return get_version(token_namespace(key))
+
+    def get(self, key, version):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is not None:
+            expires_at, cached_version, user, token = entry
+            if expires_at > time.monotonic() and cached_version == version:
+                self.count(event="hit")
+                return copy.copy(user), token
+            self.discard(key)
+        self.count(event="miss")
+        return None
+
+    def set(self, key, user, token, version):
+        with self.lock:
+            self.entries[key] = (
+                time.monotonic() + self.ttl,
+                version,
+                user,
+                token,
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def invalidate_tokens(self, keys):
+        keys = set(keys)
+        for key in keys:
+            bump_version(namespace=token_namespace(key))
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def invalidate_user(self, user_id):
+        self.invalidate_users(user_ids=[user_id])
+
+    def invalidate_users(self, user_ids):
+        from rest_framework.authtoken.models import Token
+
+        self.invalidate_tokens(
+            Token.objects.filter(user_id__in=user_ids).values_list(
+                "key", flat=True
+            )
+        )
+
+    def count(self, event):
+        now = time.monotonic()
+        with self.lock:
+            self.pending[event] += 1
+            if (
+                sum(self.pending.values()) < settings.TOKEN_CACHE_STATS_BATCH
+                and now < self.flush_at
+            ):
+                return
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending = self.pending
+            self.pending = {"hit": 0, "miss": 0}
+            self.flush_at = (
+                time.monotonic() + settings.TOKEN_CACHE_STATS_INTERVAL
+            )
+        for event, count in pending.items():
+            if count:
+                record_cache_event(namespace="token", event=event, count=count)
+
+    def stats(self):
+        """Lookups counted by every worker and the entries of this one"""
+        self.flush()
+        stats = get_cache_stats(namespace="token")
+        lookups = stats["hit"] + stats["miss"]
+        return {
+            "hits": stats["hit"],
+            "misses": stats["miss"],
+            "size": len(self.entries),
+            "hit_ratio": stats["hit"] / lookups if lookups else 0.0,
+        }
+
+
+token_cache = TokenCache(
+    maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TIMEOUT
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that skips the Token and User query on a hit"""
+
+    def authenticate_credentials(self, key):
+        if not settings.TOKEN_CACHE_ENABLED:
+            return super().authenticate_credentials(key)
+        version = token_cache.version(key)
+        cached = token_cache.get(key, version)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, *cached, version)
+        return cached
@@ -0,0 +1,141 @@
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+# Above this many members a chunk is cheaper as a bitset than as an array.
+ARRAY_LIMIT = 4096
+
+
+def bit_count(value):
+    return bin(value).count("1")
+
+
+def to_bits(container):
+    if isinstance(container, int):
+        return container
+    bits = 0
+    for low in container:
+        bits |= 1 << low
+    return bits
+
+
+def compact(container):
+    """Pick the cheaper container for a chunk, None when it is empty"""
+    if isinstance(container, int):
+        if not container:
+            return None
+        if bit_count(container) > ARRAY_LIMIT:
+            return container
+        return frozenset(iter_bits(container))
+    if not container:
+        return None
+    if len(container) > ARRAY_LIMIT:
+        return to_bits(container)
+    return frozenset(container)
+
+
+def iter_bits(bits):
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+class RoaringBitmap:
+    """Set of non-negative ints split into 2**16 chunks
+
+    Sparse chunks are frozensets of the low bits and dense chunks are int
+    bitsets, so both small postings and popular ones stay compact.
+    """
+
+    __slots__ = ("chunks",)
+
+    def __init__(self, chunks=None):
+        self.chunks = chunks or {}
+
+    @classmethod
+    def from_ids(cls, ids):
+        chunks = {}
+        for value in ids:
+            chunks.setdefault(value >> CHUNK_BITS, set()).add(
+                value & CHUNK_MASK
+            )
+        return cls(
+            {key: compact(lows) for key, lows in chunks.items() if lows}
+        )
+
+    def __len__(self):
+        return sum(
+            bit_count(container)
+            if isinstance(container, int)
+            else len(container)
+            for container in self.chunks.values()
+        )
+
+    def __bool__(self):
+        return bool(self.chunks)
+
+    def __iter__(self):
+        for key in sorted(self.chunks):
+            container = self.chunks[key]
+            lows = (
+                iter_bits(container)
+                if isinstance(container, int)
+                else sorted(container)
+            )
+            for low in lows:
+                yield key << CHUNK_BITS | low
+
+    def __contains__(self, value):
+        container = self.chunks.get(value >> CHUNK_BITS)
+        if container is None:
+            return False
+        low = value & CHUNK_MASK
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        return low in container
+
+    def __and__(self, other):
+        chunks = {}
+        for key in self.chunks.keys() & other.chunks.keys():
+            left, right = self.chunks[key], other.chunks[key]
+            if isinstance(left, int) and isinstance(right, int):
+                container = compact(left & right)
+            elif isinstance(left, int):
+                container = compact({low for low in right if left >> low & 1})
+            elif isinstance(right, int):
+                container = compact({low for low in left if right >> low & 1})
+            else:
+                container = compact(left & right)
+            if container is not None:
+                chunks[key] = container
+        return RoaringBitmap(chunks)
+
+    def __or__(self, other):
+        chunks = dict(self.chunks)
+        for key, right in other.chunks.items():
+            left = chunks.get(key)
+            if left is None:
+                chunks[key] = right
+            elif isinstance(left, int) or isinstance(right, int):
+                chunks[key] = compact(to_bits(left) | to_bits(right))
+            else:
+                chunks[key] = compact(left | right)
+        return RoaringBitmap(chunks)
+
+    def __sub__(self, other):
+        chunks = {}
+        for key, left in self.chunks.items():
+            right = other.chunks.get(key)
+            if right is None:
+                chunks[key] = left
+                continue
+            if isinstance(left, int):
+                container = compact(left & ~to_bits(right))
+            elif isinstance(right, int):
+                container = compact(
+                    {low for low in left if not right >> low & 1}
+                )
+            else:
+                container = compact(left - right)
+            if container is not None:
+                chunks[key] = container
+        return RoaringBitmap(chunks)
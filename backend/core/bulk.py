@@ -0,0 +1,247 @@
+import csv
+import hashlib
+import io
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def iter_json_records(path, chunk_size=1 << 16):
+    """Stream objects from a JSON array or an NDJSON file"""
+    decoder = json.JSONDecoder()
+    separators = " \t\r\n,[]"
+    with open(path, encoding="utf-8") as file:
+        buffer = ""
+        eof = False
+        while True:
+            buffer = buffer.lstrip(separators)
+            if not buffer:
+                if eof:
+                    return
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = chunk
+                continue
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield record
+            buffer = buffer[end:]
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    checksum = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def setup_worker():
+    if not apps.ready:
+        django.setup()
+
+
+def is_password_hashed(value):
+    try:
+        identify_hasher(value)
+    except ValueError:
+        return False
+    return True
+
+
+class PasswordHasherPool:
+    """Hash passwords with the configured hasher across worker processes"""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=setup_worker
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.executor.shutdown()
+
+    def hash(self, passwords):
+        """Return hashes in input order, keeping already hashed values"""
+        hashed = list(passwords)
+        indexes = [
+            index
+            for index, password in enumerate(hashed)
+            if not is_password_hashed(password)
+        ]
+        results = self.executor.map(
+            make_password,
+            [hashed[index] for index in indexes],
+            chunksize=max(1, len(indexes) // (self.workers * 4)),
+        )
+        for index, result in zip(indexes, results):
+            hashed[index] = result
+        return hashed
+
+
+class BulkLoader:
+    """Validate model instances in batches and insert them in bulk"""
+
+    def __init__(self, stdout, batch_size=1000, use_copy=False, validate=True):
+        self.stdout = stdout
+        self.batch_size = batch_size
+        self.validate = validate
+        self.use_copy = use_copy and connection.vendor == "postgresql"
+        self.timings = {}
+
+    def load(self, model, objects):
+        """Insert objects and return the primary keys that are stored
+
+        Rows the database drops as conflicts are reported as skipped, not
+        inserted. Their primary keys are returned only when a row with the
+        same key already exists.
+        """
+        started = time.perf_counter()
+        loaded = []
+        accepted = inserted = 0
+        for batch in batched(objects, self.batch_size):
+            valid = self.clean(model, batch)
+            accepted += len(valid)
+            with transaction.atomic():
+                rows = self.insert(model, valid)
+                if rows == len(valid):
+                    loaded.extend(
+                        obj.pk for obj in valid if obj.pk is not None
+                    )
+                else:
+                    loaded.extend(self.stored_pks(model, valid))
+            inserted += rows
+        rows, skipped, seconds = self.timings.get(model._meta.label, (0, 0, 0))
+        self.timings[model._meta.label] = (
+            rows + inserted,
+            skipped + accepted - inserted,
+            seconds + time.perf_counter() - started,
+        )
+        return loaded
+
+    def insert(self, model, objects):
+        """Insert objects and return how many rows the database stored"""
+        if not objects:
+            return 0
+        if self.use_copy:
+            # COPY has no ON CONFLICT, it stores every row or raises.
+            self.copy(model, objects)
+            return len(objects)
+        counts = []
+
+        def count_rows(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            counts.append(max(context["cursor"].rowcount, 0))
+            return result
+
+        with connection.execute_wrapper(count_rows):
+            model.objects.bulk_create(
+                objects, batch_size=self.batch_size, ignore_conflicts=True
+            )
+        return sum(counts)
+
+    def clean(self, model, objects):
+        if not self.validate:
+            return objects
+        exclude = [
+            field.name
+            for field in model._meta.concrete_fields
+            if field.is_relation
+        ]
+        valid = []
+        for obj in objects:
+            try:
+                obj.clean_fields(exclude=exclude)
+            except ValidationError as error:
+                self.stdout.write(f"{model.__name__} {obj.pk}: {error}")
+                continue
+            valid.append(obj)
+        return valid
+
+    @staticmethod
+    def stored_pks(model, objects):
+        pks = [obj.pk for obj in objects if obj.pk is not None]
+        if not pks:
+            return []
+        stored = set(
+            model.objects.filter(pk__in=pks).values_list("pk", flat=True)
+        )
+        return [pk for pk in pks if pk in stored]
+
+    @staticmethod
+    def copy(model, objects):
+        """Stream objects into PostgreSQL with COPY"""
+        if not objects:
+            return
+        fields = [
+            field
+            for field in model._meta.concrete_fields
+            if not field.primary_key or objects[0].pk is not None
+        ]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for obj in objects:
+            row = []
+            for field in fields:
+                value = field.get_db_prep_save(
+                    field.pre_save(obj, True), connection
+                )
+                row.append(r"\N" if value is None else value)
+            writer.writerow(row)
+        buffer.seek(0)
+        columns = ", ".join(
+            connection.ops.quote_name(field.column) for field in fields
+        )
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {connection.ops.quote_name(model._meta.db_table)} "
+                f"({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer,
+            )
+
+    def reset_sequences(self, *models):
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def report(self):
+        total_rows = total_seconds = 0
+        for label, (rows, skipped, seconds) in self.timings.items():
+            total_rows += rows
+            total_seconds += seconds
+            self.stdout.write(
+                f"{label}: {rows} rows in {seconds:.2f}s "
+                f"({rows / seconds if seconds else 0:.0f} rows/s, "
+                f"{skipped} skipped)"
+            )
+        self.stdout.write(
+            f"total: {total_rows} rows in {total_seconds:.2f}s "
+            f"({total_rows / total_seconds if total_seconds else 0:.0f} "
+            "rows/s)"
+        )
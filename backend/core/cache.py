@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from app.models import Tag
+from users.models import Subscription
+
+FOLLOWING_KEY = "following:{user_id}"
+VERSION_KEY = "version:{namespace}"
+TAG_IDS_KEY = "tags:ids:{version}"
+RESPONSE_KEY = "response:{namespace}:{version}:{digest}"
+STATS_KEY = "stats:{namespace}:{event}"
+
+
+def get_following_ids(user):
+    """Return a cached set of author ids the user is subscribed to"""
+    key = FOLLOWING_KEY.format(user_id=user.id)
+    following = cache.get(key)
+    if following is None:
+        following = frozenset(
+            Subscription.objects.filter(user=user).values_list(
+                "author_id", flat=True
+            )
+        )
+        cache.set(key, following, settings.FOLLOWING_CACHE_TIMEOUT)
+    return following
+
+
+def invalidate_following_ids(user_id):
+    key = FOLLOWING_KEY.format(user_id=user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def get_tag_ids():
+    """Return a cached {slug: id} map of all tags"""
+    key = TAG_IDS_KEY.format(version=get_version(namespace="tags"))
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list("slug", "id"))
+        cache.set(key, tag_ids, settings.TAG_CACHE_TIMEOUT)
+    return tag_ids
+
+
+def get_version(namespace):
+    key = VERSION_KEY.format(namespace=namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace):
+    """Invalidate everything cached under the namespace"""
+    key = VERSION_KEY.format(namespace=namespace)
+
+    def bump():
+        if not cache.add(key, time.time_ns(), None):
+            cache.incr(key)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def make_response_key(namespace, request):
+    params = sorted(
+        (name, sorted(value for value in values if value))
+        for name, values in request.query_params.lists()
+    )
+    raw = repr(
+        (
+            request.scheme,
+            request.get_host(),
+            request.path,
+            [(name, values) for name, values in params if values],
+        )
+    )
+    return RESPONSE_KEY.format(
+        namespace=namespace,
+        version=get_version(namespace),
+        digest=hashlib.md5(raw.encode()).hexdigest(),
+    )
+
+
+def record_cache_event(namespace, event, count=1):
+    key = STATS_KEY.format(namespace=namespace, event=event)
+    cache.add(key, 0, None)
+    cache.incr(key, count)
+
+
+def get_cache_stats(namespace):
+    return {
+        event: cache.get(STATS_KEY.format(namespace=namespace, event=event))
+        or 0
+        for event in ("hit", "miss")
+    }
+
+
+class CatalogSnapshot:
+    """Rendered catalog kept in the worker memory until its version changes"""
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.state = (None, b"", b"", "")
+        self.lock = threading.Lock()
+
+    def get(self, render):
+        version = get_version(self.namespace)
+        if self.state[0] != version:
+            with self.lock:
+                if self.state[0] != version:
+                    content = render()
+                    self.state = (
+                        version,
+                        content,
+                        gzip.compress(content),
+                        f'"{hashlib.sha256(content).hexdigest()}"',
+                    )
+        return self.state[1:]
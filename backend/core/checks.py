@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Cache versions must be shared by every worker that serves requests"""
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend in LOCAL_CACHE_BACKENDS and settings.WEB_CONCURRENCY > 1:
+        return [
+            Error(
+                f"{backend} is local to one process, but WEB_CONCURRENCY "
+                f"is {settings.WEB_CONCURRENCY}.",
+                hint=(
+                    "Set CACHE_LOCATION to a Redis URL. Cache invalidation "
+                    "by another worker or a management command is not seen "
+                    "by the other processes otherwise."
+                ),
+                id="core.E001",
+            )
+        ]
+    return []
@@ -1,10 +1,58 @@
+import json
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import (
+    BooleanField,
+    Case,
+    Exists,
+    IntegerField,
+    OuterRef,
+    Value,
+    When,
+)
+from django.db.models.expressions import RawSQL
 from django_filters import rest_framework as filters
 
-from app.models import Ingredient, Recipe
+from app.models import Ingredient, Recipe, RecipeTag
+from core.cache import get_tag_ids
+from core.ingredient_index import ingredient_index
+from core.search import normalize_search_text, search_recipes
 
 User = get_user_model()
 
+# Per vendor: ids passed as a single array parameter, so the statement does
+# not grow with the number of recipes matched by the ingredient index.
+ID_ARRAY = {
+    "postgresql": ("{table}.id = ANY(%s)", list),
+    "sqlite": (
+        "{table}.id IN (SELECT value FROM json_each(%s))",
+        lambda ids: json.dumps(list(ids)),
+    ),
+}
+
+
+def filter_by_ids(queryset, ids, exclude=False):
+    """Keep (or drop) the rows with the ids using one query parameter"""
+    vendor = connections[queryset.db].vendor
+    if vendor not in ID_ARRAY:
+        lookup = {"pk__in": list(ids)}
+        return (
+            queryset.exclude(**lookup)
+            if exclude
+            else queryset.filter(**lookup)
+        )
+    sql, adapt = ID_ARRAY[vendor]
+    condition = RawSQL(
+        sql.format(table=queryset.model._meta.db_table),
+        (adapt(ids),),
+        output_field=BooleanField(),
+    )
+    return (
+        queryset.exclude(condition) if exclude else queryset.filter(condition)
+    )
+
 
 def if_user_is_anonymous(func):
     def check_user(self, queryset, name, value, *args, **kwargs):
@@ -23,18 +71,54 @@ class IngredientFilter(filters.FilterSet):
         fields = ["name"]
 
     def name_search(self, queryset, name, value):
+        value = normalize_search_text(value)
         if not value:
             return queryset
-        return queryset.filter(name__iregex=value)
+        matches = self.rank_matches(
+            queryset.filter(search_name__contains=value), value
+        )
+        limited = matches.values("pk")[: settings.INGREDIENT_SEARCH_LIMIT]
+        return self.rank_matches(queryset.filter(pk__in=limited), value)
+
+    @staticmethod
+    def rank_matches(queryset, value):
+        return queryset.annotate(
+            match_rank=Case(
+                When(search_name__startswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by("match_rank", "search_name")
+
+
+def tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
 
 
 class RecipeFilter(filters.FilterSet):
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
-    tags = filters.AllValuesMultipleFilter(field_name="tags__slug")
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices, method="filter_by_tags"
+    )
     is_favorited = filters.NumberFilter(method="get_is_favorited")
     is_in_shopping_cart = filters.NumberFilter(
         method="get_is_in_shopping_cart"
     )
+    search = filters.CharFilter(method="full_text_search")
+    ingredients = NumberInFilter(method="filter_by_ingredients")
+    exclude_ingredients = NumberInFilter(method="filter_by_ingredients")
+    coverage = filters.BooleanFilter(method="filter_by_ingredients")
+    ordering = filters.OrderingFilter(
+        fields=(
+            ("created_at", "created_at"),
+            ("favorites_count", "favorites_count"),
+            ("cart_count", "cart_count"),
+        )
+    )
 
     class Meta:
         model = Recipe
@@ -43,6 +127,63 @@ class RecipeFilter(filters.FilterSet):
             "author",
         )
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.form.cleaned_data.get("ordering"):
+            # Break ties so page number pagination stays stable.
+            queryset = queryset.order_by(*queryset.query.order_by, "-id")
+        return queryset
+
+    def filter_by_tags(self, queryset, name, value):
+        tag_ids = get_tag_ids()
+        return queryset.filter(
+            Exists(
+                RecipeTag.objects.filter(
+                    recipe=OuterRef("pk"),
+                    tag_id__in=[
+                        tag_ids[slug] for slug in value if slug in tag_ids
+                    ],
+                )
+            )
+        )
+
+    def full_text_search(self, queryset, name, value):
+        queryset = search_recipes(queryset, value)
+        if "search_rank" not in queryset.query.annotations:
+            return queryset
+        return queryset.order_by("-search_rank", "-id")
+
+    def filter_by_ingredients(self, queryset, name, value):
+        # The three parameters are answered together by the first of them.
+        if getattr(self, "ingredients_filtered", False):
+            return queryset
+        self.ingredients_filtered = True
+        include = self.form.cleaned_data.get("ingredients") or ()
+        exclude = self.form.cleaned_data.get("exclude_ingredients") or ()
+        if self.form.cleaned_data.get("coverage") and include:
+            return self.order_by_coverage(queryset, include, exclude)
+        matched, excluded = ingredient_index.match(include, exclude)
+        if matched is not None:
+            queryset = filter_by_ids(queryset, matched - excluded)
+        elif excluded:
+            queryset = filter_by_ids(queryset, excluded, exclude=True)
+        return queryset
+
+    @staticmethod
+    def order_by_coverage(queryset, include, exclude):
+        ranked = ingredient_index.coverage(
+            include, exclude, limit=settings.INGREDIENT_COVERAGE_LIMIT
+        )
+        return queryset.filter(pk__in=ranked).order_by(
+            Case(
+                *(
+                    When(pk=recipe_id, then=Value(position))
+                    for position, recipe_id in enumerate(ranked)
+                ),
+                output_field=IntegerField(),
+            )
+        )
+
     @if_user_is_anonymous
     def get_is_favorited(self, queryset, name, value):
         if value:
@@ -1,7 +1,10 @@
+import functools
 import io
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import F, Sum
+from django.core.cache import cache
+from django.db.models import F
 from django.http import FileResponse
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import cm
@@ -10,11 +13,17 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 from rest_framework.validators import ValidationError
 
-from app.models import RecipeIngredient
+from app.models import Recipe
+from core.cache import get_version
 from core.exceptions import Http400Error
 
 User = get_user_model()
 
+PDF_FONT = "DejaVuSerif"
+PDF_FONT_SIZE = 14
+PDF_LEADING = 17
+PDF_KEY = "pdf:{cart_id}:{cart_version}:{recipes_version}"
+
 
 def get_queryset(klass):
     if hasattr(klass, "_default_manager"):
@@ -46,27 +55,26 @@ def get_object_or_400(klass, *args, **kwargs):
         )
 
 
-def get_pdf(user, cart):
-    buffer = io.BytesIO()
-    page = canvas.Canvas(buffer, pagesize=letter, bottomup=0)
-    pdfmetrics.registerFont(TTFont("DejaVuSerif", "DejaVuSerif.ttf"))
-    textobject = page.beginText()
-    textobject.setTextOrigin(cm, cm)
-    textobject.setFont("DejaVuSerif", 14)
-    lines = [
-        cart.__str__(),
-    ]
-    cartitems = cart.cart_items.all()
-    ingredients = (
-        RecipeIngredient.objects.filter(recipe__cart_items__cart=cart)
-        .values(
-            ingredient_in=F("ingredient__name"),
-            measure=F("ingredient__measurement_unit"),
-        )
-        .annotate(amount=Sum("amount"))
+@functools.lru_cache(maxsize=None)
+def register_pdf_font():
+    pdfmetrics.registerFont(TTFont(PDF_FONT, settings.PDF_FONT_PATH))
+    return PDF_FONT
+
+
+def get_pdf_lines(user, cart):
+    recipes = (
+        Recipe.objects.filter(cart_items__cart=cart)
+        .order_by("name")
+        .values_list("name", flat=True)
     )
-    for cartitem in cartitems:
-        lines.append(cartitem.__str__())
+    ingredients = cart.ingredient_totals.values(
+        "amount",
+        ingredient_in=F("ingredient__name"),
+        measure=F("ingredient__measurement_unit"),
+    ).order_by("ingredient__name")
+    lines = [f"Корзина пользователя {user.username}"]
+    for recipe in recipes:
+        lines.append(f"Рецепт {recipe} в корзине пользователя {user.username}")
     lines.append("Cписок покупок:")
     for ingredient in ingredients:
         lines.append(
@@ -74,14 +82,38 @@ def get_pdf(user, cart):
             f"{ingredient['amount']} "
             f"{ingredient['measure']}"
         )
-    for line in lines:
-        textobject.textLine(line)
-    page.drawText(textobject)
-    page.showPage()
+    return lines
+
+
+def render_pdf(lines):
+    font = register_pdf_font()
+    buffer = io.BytesIO()
+    page = canvas.Canvas(buffer, pagesize=letter, bottomup=0)
+    lines_per_page = int((letter[1] - 2 * cm) // PDF_LEADING)
+    for start in range(0, len(lines), lines_per_page):
+        textobject = page.beginText()
+        textobject.setTextOrigin(cm, cm)
+        textobject.setFont(font, PDF_FONT_SIZE, leading=PDF_LEADING)
+        for line in lines[start : start + lines_per_page]:
+            textobject.textLine(line)
+        page.drawText(textobject)
+        page.showPage()
     page.save()
-    buffer.seek(0)
+    return buffer.getvalue()
+
+
+def get_pdf(user, cart):
+    key = PDF_KEY.format(
+        cart_id=cart.id,
+        cart_version=get_version(namespace=f"cart:{cart.id}"),
+        recipes_version=get_version(namespace="recipes"),
+    )
+    content = cache.get(key)
+    if content is None:
+        content = render_pdf(lines=get_pdf_lines(user=user, cart=cart))
+        cache.set(key, content, settings.PDF_CACHE_TIMEOUT)
     return FileResponse(
-        buffer,
+        io.BytesIO(content),
         as_attachment=True,
         filename="shopping-cart.pdf",
     )
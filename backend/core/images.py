@@ -0,0 +1,105 @@
+import functools
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+from rest_framework.validators import ValidationError
+
+from core.cache import bump_version
+
+logger = logging.getLogger(__name__)
+
+RENDITION_PATH = "images/renditions/{rendition}.{extension}"
+RENDITION_FORMATS = {"WEBP": "webp", "JPEG": "jpg"}
+UPLOAD_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+
+def check_image_header(file):
+    """Validate format and dimensions reading only the image header
+
+    Return the format found in the header, which the file name and the
+    client supplied content type may not match.
+    """
+    try:
+        with Image.open(file) as image:
+            image_format, (width, height) = image.format, image.size
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError("Загрузите корректное изображение")
+    finally:
+        file.seek(0)
+    if image_format not in settings.IMAGE_ALLOWED_FORMATS:
+        raise ValidationError(
+            "Допустимые форматы изображения: "
+            + ", ".join(settings.IMAGE_ALLOWED_FORMATS)
+        )
+    if max(width, height) > settings.IMAGE_MAX_DIMENSION:
+        raise ValidationError(
+            "Изображение не может быть больше "
+            f"{settings.IMAGE_MAX_DIMENSION} пикселей по стороне"
+        )
+    return image_format
+
+
+def make_renditions(name):
+    """Save resized copies of an image in every rendition format"""
+    with default_storage.open(name) as file, Image.open(file) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    renditions = {}
+    for rendition, size in settings.IMAGE_RENDITIONS.items():
+        resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+        renditions[rendition] = {}
+        for image_format, extension in RENDITION_FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, quality=settings.IMAGE_QUALITY)
+            renditions[rendition][extension] = default_storage.save(
+                RENDITION_PATH.format(
+                    rendition=rendition, extension=extension
+                ),
+                ContentFile(buffer.getvalue()),
+            )
+    return renditions
+
+
+def process_recipe_image(recipe_id, name):
+    from app.models import Recipe
+
+    renditions = make_renditions(name)
+    updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_renditions=renditions
+    )
+    if updated:
+        bump_version(namespace="recipes")
+
+
+@functools.lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(
+        max_workers=settings.IMAGE_WORKERS, thread_name_prefix="images"
+    )
+
+
+def run_in_worker(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Image processing failed for %s", args)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe):
+    """Build renditions in the worker pool once the upload is committed"""
+    args = (recipe.pk, recipe.image.name)
+    if not settings.IMAGE_WORKERS:
+        transaction.on_commit(lambda: process_recipe_image(*args))
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(
+            run_in_worker, process_recipe_image, *args
+        )
+    )
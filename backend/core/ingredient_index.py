@@ -0,0 +1,174 @@
+import heapq
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.bitmap import RoaringBitmap
+from core.cache import get_version
+
+EMPTY = RoaringBitmap()
+
+SEQUENCE_KEY = "{namespace}:{version}:sequence"
+
+DELTA_KEY = "{namespace}:{version}:delta:{number}"
+
+
+class IngredientIndex:
+    """Ingredient id to a bitmap of recipe ids, kept in the worker memory
+
+    The index is built with a single scan of RecipeIngredient and then
+    follows per-recipe deltas. Signals publish each delta to the shared
+    cache on commit under an increasing number, and every worker applies
+    the ones it has not seen on its next lookup. Bumping the namespace
+    version, as the bulk loaders do, or a delta that has already expired
+    from the cache, rebuilds the index from scratch instead.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        # Version, last applied delta, postings and {recipe: ingredients}.
+        self.state = (None, 0, {}, {})
+        self.lock = threading.Lock()
+
+    def load(self):
+        version = get_version(self.namespace)
+        sequence = cache.get(self.sequence_key(version), 0)
+        if self.state[:2] != (version, sequence):
+            with self.lock:
+                if self.state[:2] != (version, sequence):
+                    self.state = self.follow(version, sequence)
+        return self.state[2:]
+
+    def follow(self, version, sequence):
+        applied, postings, recipes = self.state[1:]
+        if self.state[0] == version and sequence > applied:
+            keys = [
+                self.delta_key(version, number)
+                for number in range(applied + 1, sequence + 1)
+            ]
+            if len(keys) <= settings.INGREDIENT_INDEX_MAX_DELTAS:
+                deltas = cache.get_many(keys)
+                if len(deltas) == len(keys):
+                    postings, recipes = dict(postings), dict(recipes)
+                    for key in keys:
+                        self.apply(postings, recipes, *deltas[key])
+                    return version, sequence, postings, recipes
+        # Deltas published while the table is scanned are applied on top
+        # of the rebuilt index by the next lookup.
+        return version, sequence, *self.build()
+
+    @staticmethod
+    def build():
+        from app.models import RecipeIngredient
+
+        recipe_ids, recipes = {}, {}
+        links = RecipeIngredient.objects.values_list(
+            "ingredient_id", "recipe_id"
+        )
+        for ingredient_id, recipe_id in links.iterator(chunk_size=10000):
+            recipe_ids.setdefault(ingredient_id, []).append(recipe_id)
+            recipes.setdefault(recipe_id, set()).add(ingredient_id)
+        postings = {
+            ingredient_id: RoaringBitmap.from_ids(ids)
+            for ingredient_id, ids in recipe_ids.items()
+        }
+        return postings, {
+            recipe_id: frozenset(ingredient_ids)
+            for recipe_id, ingredient_ids in recipes.items()
+        }
+
+    @staticmethod
+    def apply(postings, recipes, recipe_id, removed, added):
+        """Move one recipe between postings; None removes all of them"""
+        current = recipes.pop(recipe_id, frozenset())
+        removed = current if removed is None else current & removed
+        added = added - current
+        recipe = RoaringBitmap.from_ids([recipe_id])
+        for ingredient_id in removed:
+            bitmap = postings[ingredient_id] - recipe
+            if bitmap:
+                postings[ingredient_id] = bitmap
+            else:
+                del postings[ingredient_id]
+        for ingredient_id in added:
+            postings[ingredient_id] = (
+                postings.get(ingredient_id, EMPTY) | recipe
+            )
+        current = (current - removed) | added
+        if current:
+            recipes[recipe_id] = current
+
+    def publish(self, recipe_id, removed=(), added=()):
+        """Queue a change of the recipe ingredients for every worker"""
+        removed = None if removed is None else frozenset(removed)
+        added = frozenset(added)
+        if removed or removed is None or added:
+            transaction.on_commit(
+                partial(self.send, recipe_id, removed, added)
+            )
+
+    def send(self, *delta):
+        version = get_version(self.namespace)
+        key = self.sequence_key(version)
+        cache.add(key, 0, None)
+        cache.set(
+            self.delta_key(version, cache.incr(key)),
+            delta,
+            settings.INGREDIENT_INDEX_DELTA_TIMEOUT,
+        )
+
+    def sequence_key(self, version):
+        return SEQUENCE_KEY.format(namespace=self.namespace, version=version)
+
+    def delta_key(self, version, number):
+        return DELTA_KEY.format(
+            namespace=self.namespace, version=version, number=number
+        )
+
+    def match(self, include=(), exclude=()):
+        """Return recipes with all included ingredients and the excluded ones
+
+        The first bitmap is None when nothing is included, meaning every
+        recipe.
+        """
+        postings, _ = self.load()
+        matched = None
+        for ingredient_id in sorted(
+            set(include), key=lambda key: len(postings.get(key, EMPTY))
+        ):
+            bitmap = postings.get(ingredient_id, EMPTY)
+            matched = bitmap if matched is None else matched & bitmap
+            if not matched:
+                break
+        return matched, self.union(postings, exclude)
+
+    def coverage(self, include, exclude=(), limit=None):
+        """Rank recipes by the share of their ingredients that are included"""
+        postings, recipes = self.load()
+        excluded = self.union(postings, exclude)
+        counts = {}
+        for ingredient_id in set(include):
+            for recipe_id in postings.get(ingredient_id, EMPTY) - excluded:
+                counts[recipe_id] = counts.get(recipe_id, 0) + 1
+        return heapq.nsmallest(
+            limit or len(counts),
+            counts,
+            key=lambda key: (
+                -counts[key] / len(recipes[key]),
+                -counts[key],
+                key,
+            ),
+        )
+
+    @staticmethod
+    def union(postings, ingredient_ids):
+        result = EMPTY
+        for ingredient_id in set(ingredient_ids):
+            result = result | postings.get(ingredient_id, EMPTY)
+        return result
+
+
+ingredient_index = IngredientIndex(namespace="recipe_ingredients")
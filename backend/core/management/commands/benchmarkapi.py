@@ -0,0 +1,182 @@
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from app.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+def percentile(samples, percent):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[
+        percent - 1
+    ]
+
+
+class Command(BaseCommand):
+    help = "Замер задержек и количества SQL-запросов основных эндпоинтов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--output", type=Path, default=None)
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            default=[],
+            help="Запустить только сценарии с этим префиксом",
+        )
+
+    def handle(self, *args, **options):
+        scenarios = {
+            name: scenario
+            for name, scenario in self.get_scenarios().items()
+            if not options["scenario"]
+            or name.startswith(tuple(options["scenario"]))
+        }
+        results = {}
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]
+        ):
+            for name, (client, method, urls) in scenarios.items():
+                results[name] = self.measure(
+                    client,
+                    method,
+                    urls,
+                    options["iterations"],
+                    options["warmup"],
+                )
+                self.stdout.write(
+                    f"{name}: p50={results[name]['p50_ms']:.1f}ms "
+                    f"p95={results[name]['p95_ms']:.1f}ms "
+                    f"queries={results[name]['queries']}"
+                )
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "vendor": connection.vendor,
+            "dataset": {
+                "users": User.objects.count(),
+                "recipes": Recipe.objects.count(),
+                "ingredients": Ingredient.objects.count(),
+            },
+            "iterations": options["iterations"],
+            "results": results,
+        }
+        if options["output"] is not None:
+            options["output"].write_text(
+                json.dumps(report, ensure_ascii=False, indent=2)
+            )
+        return None
+
+    def get_scenarios(self):
+        user = (
+            User.objects.annotate(favorites_total=Count("favorites"))
+            .order_by("-favorites_total")
+            .first()
+        )
+        recipe = Recipe.objects.order_by("-created_at").first()
+        tags = list(Tag.objects.order_by("id")[:2])
+        tag, other_tag = (tags[0], tags[-1]) if tags else (None, None)
+        ingredient = Ingredient.objects.first()
+        if None in (user, recipe, tag, ingredient):
+            raise CommandError("Недостаточно данных, запустите generatedata")
+        author = (
+            User.objects.annotate(recipes_total=Count("recipes"))
+            .order_by("-recipes_total")
+            .first()
+        )
+        client = APIClient()
+        client.force_authenticate(user=user)
+        anonymous = APIClient()
+        recipes = "/api/recipes/"
+        return {
+            "recipes_list_anonymous": (anonymous, "get", (recipes,)),
+            "recipes_list": (client, "get", (recipes,)),
+            "recipes_list_tags": (
+                client,
+                "get",
+                (f"{recipes}?tags={tag.slug}",),
+            ),
+            "recipes_list_tags_two": (
+                client,
+                "get",
+                (f"{recipes}?tags={tag.slug}&tags={other_tag.slug}",),
+            ),
+            "recipes_list_author": (
+                client,
+                "get",
+                (f"{recipes}?author={author.id}",),
+            ),
+            "recipes_list_favorited": (
+                client,
+                "get",
+                (f"{recipes}?is_favorited=1",),
+            ),
+            "recipe_detail": (client, "get", (f"{recipes}{recipe.id}/",)),
+            "ingredient_search": (
+                client,
+                "get",
+                (f"/api/ingredients/?name={ingredient.name[:3]}",),
+            ),
+            "subscriptions": (
+                client,
+                "get",
+                ("/api/users/subscriptions/?recipes_limit=3",),
+            ),
+            "shopping_cart_toggle": (
+                client,
+                "toggle",
+                (f"{recipes}{recipe.id}/shopping_cart/",),
+            ),
+            "download_shopping_cart": (
+                client,
+                "get",
+                (f"{recipes}download_shopping_cart/",),
+            ),
+        }
+
+    @staticmethod
+    def request(client, method, url):
+        if method == "toggle":
+            statuses = {client.post(url).status_code}
+            statuses.add(client.delete(url).status_code)
+            return max(statuses)
+        response = client.get(url)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response.status_code
+
+    def measure(self, client, method, urls, iterations, warmup):
+        for _ in range(warmup):
+            for url in urls:
+                self.request(client, method, url)
+        timings, queries, statuses = [], [], set()
+        for _ in range(iterations):
+            for url in urls:
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    statuses.add(self.request(client, method, url))
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(context.captured_queries))
+        return {
+            "p50_ms": percentile(timings, 50),
+            "p90_ms": percentile(timings, 90),
+            "p95_ms": percentile(timings, 95),
+            "p99_ms": percentile(timings, 99),
+            "mean_ms": statistics.fmean(timings),
+            "queries": statistics.median_high(queries),
+            "max_queries": max(queries),
+            "statuses": sorted(statuses),
+        }
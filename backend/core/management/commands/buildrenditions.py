@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.models import Recipe
+from core.images import process_recipe_image, run_in_worker
+
+
+class Command(BaseCommand):
+    help = "Создание уменьшенных копий изображений рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Пересоздать копии для всех рецептов",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=settings.IMAGE_WORKERS or 1
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image="").exclude(image=None)
+        if not options["force"]:
+            recipes = recipes.filter(image_renditions={})
+        items = list(recipes.values_list("id", "image"))
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for recipe_id, name in items:
+                executor.submit(
+                    run_in_worker, process_recipe_image, recipe_id, name
+                )
+        self.stdout.write(f"images processed: {len(items)}")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import get_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Статистика попаданий в кэш ответов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "namespaces", nargs="*", default=["recipes"], type=str
+        )
+
+    def handle(self, *args, **options):
+        for namespace in options["namespaces"]:
+            stats = get_cache_stats(namespace=namespace)
+            total = stats["hit"] + stats["miss"]
+            ratio = stats["hit"] / total if total else 0
+            self.stdout.write(
+                f"{namespace}: hit={stats['hit']} miss={stats['miss']} "
+                f"ratio={ratio:.2%}"
+            )
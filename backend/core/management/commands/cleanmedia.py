@@ -0,0 +1,66 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import Recipe
+
+MEDIA_DIRECTORY = "images"
+
+
+class Command(BaseCommand):
+    help = "Удаление изображений, на которые не ссылается ни один рецепт"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, что будет удалено",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=60 * 60,
+            help="Не трогать файлы моложе указанного числа секунд",
+        )
+
+    def handle(self, *args, **options):
+        references = self.count_references()
+        cutoff = timezone.now() - timedelta(seconds=options["min_age"])
+        removed = 0
+        for name in self.walk(MEDIA_DIRECTORY):
+            if references[name]:
+                continue
+            if default_storage.get_modified_time(name) > cutoff:
+                continue
+            removed += 1
+            if options["dry_run"]:
+                self.stdout.write(name)
+            else:
+                default_storage.delete(name)
+        shared = sum(1 for count in references.values() if count > 1)
+        self.stdout.write(
+            f"blobs removed: {removed}, referenced: {len(references)}, "
+            f"shared: {shared}"
+        )
+
+    @staticmethod
+    def count_references():
+        references = Counter()
+        recipes = Recipe.objects.values_list("image", "image_renditions")
+        for image, renditions in recipes.iterator():
+            references[image] += 1
+            for files in renditions.values():
+                references.update(files.values())
+        return references
+
+    def walk(self, directory):
+        if not default_storage.exists(directory):
+            return
+        directories, files = default_storage.listdir(directory)
+        for name in files:
+            yield f"{directory}/{name}"
+        for name in directories:
+            yield from self.walk(f"{directory}/{name}")
@@ -0,0 +1,141 @@
+import re
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.views import CustomUserViewSet, IngredientViewSet, RecipeViewSet
+from app.models import Ingredient, Recipe, Tag
+from cart.models import CartIngredient
+
+User = get_user_model()
+
+POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+SQLITE_LINE = re.compile(r"^\d+ (\d+) \d+ (.*)$", re.MULTILINE)
+SQLITE_SCAN = re.compile(r"^SCAN (\w+)( USING (?:COVERING )?INDEX \w+)?$")
+SQLITE_SORT = "USE TEMP B-TREE FOR ORDER BY"
+ALIAS_PATTERN = re.compile(r'"(\w+)" (U\d+)\b')
+# Substring search has no btree to use outside PostgreSQL's trigram index.
+ALLOWED_SCANS = {"sqlite": {"ingredient_search": {"app_ingredient"}}}
+
+
+def find_sqlite_scans(plan):
+    """Plain scans, and index walks whose order is thrown away by a sort"""
+    lines = SQLITE_LINE.findall(plan)
+    sorted_after = any(
+        parent == "0" and detail == SQLITE_SORT for parent, detail in lines
+    )
+    scans = set()
+    for parent, detail in lines:
+        match = SQLITE_SCAN.match(detail)
+        if match and (not match.group(2) or (parent == "0" and sorted_after)):
+            scans.add(match.group(1))
+    return scans
+
+
+def find_scans(plan, sql, vendor):
+    """Return the tables the plan reads in full, resolving subquery aliases"""
+    if vendor == "postgresql":
+        names = set(POSTGRES_SCAN.findall(plan))
+    elif vendor == "sqlite":
+        names = find_sqlite_scans(plan)
+    else:
+        names = set()
+    aliases = {alias: table for table, alias in ALIAS_PATTERN.findall(sql)}
+    return {aliases.get(name, name) for name in names}
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN горячих запросов и поиск полных просмотров больших таблиц"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=10000,
+            help="Таблицы меньше этого размера считаются маленькими",
+        )
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Печатать планы целиком",
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        large_tables = self.get_large_tables(options["min_rows"])
+        failures = []
+        for name, queryset in self.get_queries().items():
+            plan = queryset.explain()
+            allowed = ALLOWED_SCANS.get(vendor, {}).get(name, set())
+            scans = find_scans(plan, str(queryset.query), vendor)
+            scans = (scans & large_tables) - allowed
+            status = "SEQ SCAN " + ", ".join(sorted(scans)) if scans else "ok"
+            self.stdout.write(f"{name}: {status}")
+            if options["verbose_plans"] or scans:
+                self.stdout.write(plan)
+            if scans:
+                failures.append(name)
+        if failures:
+            raise CommandError(
+                "Полный просмотр больших таблиц: " + ", ".join(failures)
+            )
+
+    @staticmethod
+    def get_large_tables(min_rows):
+        return {
+            model._meta.db_table
+            for model in apps.get_models()
+            if model._meta.managed
+            and (min_rows <= 0 or model.objects.count() >= min_rows)
+        }
+
+    def get_queries(self):
+        user = User.objects.filter(subscriber__isnull=False).first()
+        recipe = Recipe.objects.first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        if None in (user, recipe, tag, ingredient):
+            raise CommandError("Недостаточно данных, запустите generatedata")
+        recipes = {
+            "recipe_list": {},
+            "recipe_list_author": {"author": recipe.author_id},
+            "recipe_list_tags": {"tags": tag.slug},
+            "recipe_list_favorited": {"is_favorited": 1},
+            "recipe_list_in_cart": {"is_in_shopping_cart": 1},
+            "recipe_list_popular": {"ordering": "-favorites_count"},
+        }
+        queries = {
+            name: self.list_queryset(RecipeViewSet, user, params)[:6]
+            for name, params in recipes.items()
+        }
+        queries["recipe_detail"] = self.list_queryset(
+            RecipeViewSet, user, {}
+        ).filter(pk=recipe.pk)
+        queries["ingredient_search"] = self.list_queryset(
+            IngredientViewSet, user, {"name": ingredient.name[:3]}
+        )
+        users = self.get_view(CustomUserViewSet, user, {}, "subscriptions")
+        queries["subscriptions"] = users.get_subscriptions_queryset()[:6]
+        queries["subscription_recipes"] = Recipe.objects.filter(
+            author__in=queries["subscriptions"]
+        ).order_by("-created_at")
+        queries["shopping_list"] = CartIngredient.objects.filter(
+            cart__user=user
+        ).select_related("ingredient")
+        return queries
+
+    @staticmethod
+    def get_view(viewset, user, params, action="list"):
+        request = Request(APIRequestFactory().get("/", params))
+        request.user = user
+        view = viewset(request=request, format_kwarg=None, kwargs={})
+        view.action = action
+        return view
+
+    def list_queryset(self, viewset, user, params):
+        view = self.get_view(viewset, user, params)
+        return view.filter_queryset(view.get_queryset())
@@ -0,0 +1,249 @@
+import itertools
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from app.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+)
+from cart.models import Cart, CartItem
+from core.bulk import BulkLoader
+from core.cache import bump_version
+from users.models import Subscription
+
+User = get_user_model()
+
+TEXT = (
+    "Нарезать, смешать, довести до кипения и томить на медленном огне. "
+    "Подавать горячим, посыпав свежей зеленью."
+)
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+
+
+def zipf_weights(size, exponent):
+    """Cumulative weights giving rank r a probability ~ 1 / r ** exponent"""
+    return list(
+        itertools.accumulate(
+            1 / rank**exponent for rank in range(1, size + 1)
+        )
+    )
+
+
+class Command(BaseCommand):
+    help = "Генерация синтетического набора данных для нагрузочных тестов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50_000)
+        parser.add_argument("--recipes", type=int, default=500_000)
+        parser.add_argument("--favorites", type=int, default=2_000_000)
+        parser.add_argument("--cart-items", type=int, default=200_000)
+        parser.add_argument("--subscriptions", type=int, default=500_000)
+        parser.add_argument("--tags", type=int, default=10)
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.1,
+            help="Показатель распределения Ципфа для авторов и рецептов",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--copy", action="store_true")
+
+    def handle(self, *args, **options):
+        ingredient_ids = list(Ingredient.objects.values_list("id", flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                "Справочник ингридиентов пуст, загрузите его командой "
+                "importcatalog или updatedatabase"
+            )
+        self.random = random.Random(options["seed"])
+        self.skew = options["skew"]
+        loader = BulkLoader(
+            stdout=self.stdout,
+            batch_size=options["batch_size"],
+            use_copy=options["copy"],
+            validate=False,
+        )
+        user_ids = self.create_users(loader, options["users"])
+        tag_ids = self.create_tags(loader, options["tags"])
+        recipe_ids = self.create_recipes(
+            loader, options["recipes"], user_ids, tag_ids, ingredient_ids
+        )
+        loader.load(
+            model=Subscription,
+            objects=(
+                Subscription(user_id=user_id, author_id=author_id)
+                for user_id, author_id in self.pairs(
+                    user_ids, user_ids, options["subscriptions"]
+                )
+                if user_id != author_id
+            ),
+        )
+        loader.load(
+            model=FavoriteRecipe,
+            objects=(
+                FavoriteRecipe(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in self.pairs(
+                    user_ids, recipe_ids, options["favorites"]
+                )
+            ),
+        )
+        self.create_carts(loader, options["cart_items"], user_ids, recipe_ids)
+        loader.reset_sequences(
+            User,
+            Tag,
+            Recipe,
+            RecipeIngredient,
+            RecipeTag,
+            Subscription,
+            FavoriteRecipe,
+            Cart,
+            CartItem,
+        )
+        call_command("rebuildshoppinglists", stdout=self.stdout)
+        call_command("reconcilecounters", stdout=self.stdout)
+        for namespace in ("recipes", "tags", "recipe_ingredients"):
+            bump_version(namespace=namespace)
+        loader.report()
+
+    def create_users(self, loader, count):
+        start = next_id(User)
+        password = make_password("password")
+        loader.load(
+            model=User,
+            objects=(
+                User(
+                    id=user_id,
+                    username=f"user{user_id}",
+                    email=f"user{user_id}@example.com",
+                    first_name="Имя",
+                    last_name="Фамилия",
+                    password=password,
+                )
+                for user_id in range(start, start + count)
+            ),
+        )
+        return list(range(start, start + count))
+
+    def create_tags(self, loader, count):
+        existing = list(Tag.objects.values_list("id", flat=True))
+        start = next_id(Tag)
+        loader.load(
+            model=Tag,
+            objects=(
+                Tag(
+                    id=tag_id,
+                    name=f"Тег {tag_id}",
+                    color=f"#{self.random.randrange(1 << 24):06X}",
+                    slug=f"tag-{tag_id}",
+                )
+                for tag_id in range(start, start + count - len(existing))
+            ),
+        )
+        return existing + list(range(start, start + count - len(existing)))
+
+    def create_recipes(self, loader, count, user_ids, tag_ids, ingredient_ids):
+        start = next_id(Recipe)
+        recipe_ids = list(range(start, start + count))
+        authors = self.random.choices(
+            user_ids,
+            cum_weights=zipf_weights(len(user_ids), self.skew),
+            k=count,
+        )
+        loader.load(
+            model=Recipe,
+            objects=(
+                Recipe(
+                    id=recipe_id,
+                    name=f"Рецепт {recipe_id}",
+                    text=TEXT,
+                    cooking_time=self.random.randint(1, 180),
+                    image="images/borsch.jpg",
+                    author_id=author_id,
+                )
+                for recipe_id, author_id in zip(recipe_ids, authors)
+            ),
+        )
+        loader.load(
+            model=RecipeTag,
+            objects=(
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self.random.sample(
+                    tag_ids, min(len(tag_ids), self.random.randint(1, 3))
+                )
+            ),
+        )
+        loader.load(
+            model=RecipeIngredient,
+            objects=(
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in self.random.sample(
+                    ingredient_ids,
+                    min(len(ingredient_ids), self.random.randint(3, 10)),
+                )
+            ),
+        )
+        return recipe_ids
+
+    def create_carts(self, loader, count, user_ids, recipe_ids):
+        items = list(self.pairs(user_ids, recipe_ids, count))
+        cart_ids = {}
+        start = next_id(Cart)
+        for user_id, _ in items:
+            cart_ids.setdefault(user_id, start + len(cart_ids))
+        existing = set(
+            Cart.objects.filter(user_id__in=cart_ids).values_list(
+                "user_id", flat=True
+            )
+        )
+        if existing:
+            raise CommandError("У части пользователей уже есть корзины")
+        loader.load(
+            model=Cart,
+            objects=(
+                Cart(id=cart_id, user_id=user_id)
+                for user_id, cart_id in cart_ids.items()
+            ),
+        )
+        loader.load(
+            model=CartItem,
+            objects=(
+                CartItem(cart_id=cart_ids[user_id], recipe_id=recipe_id)
+                for user_id, recipe_id in items
+            ),
+        )
+
+    def pairs(self, owners, targets, count):
+        """Unique (owner, target) pairs with popular targets picked more"""
+        if not owners or not targets:
+            return
+        weights = zipf_weights(len(targets), self.skew)
+        seen = set()
+        attempts = 0
+        while len(seen) < count and attempts < count * 3:
+            attempts += 1
+            pair = (
+                self.random.choice(owners),
+                self.random.choices(targets, cum_weights=weights)[0],
+            )
+            if pair not in seen:
+                seen.add(pair)
+                yield pair
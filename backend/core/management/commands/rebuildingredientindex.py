@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.cache import bump_version
+from core.ingredient_index import ingredient_index
+
+
+class Command(BaseCommand):
+    help = "Перестроение индекса рецептов по ингредиентам во всех процессах"
+
+    def handle(self, *args, **options):
+        bump_version(namespace=ingredient_index.namespace)
+        started = time.perf_counter()
+        postings, recipes = ingredient_index.load()
+        self.stdout.write(
+            f"ingredients: {len(postings)}, recipes: {len(recipes)}, "
+            f"built in {time.perf_counter() - started:.2f}s"
+        )
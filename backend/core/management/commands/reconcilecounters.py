@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from app.models import FavoriteRecipe, Recipe
+from cart.models import CartItem
+from core.bulk import batched
+from core.cache import bump_version
+from users.models import Subscription
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, "favorites_count", FavoriteRecipe, "recipe"),
+    (Recipe, "cart_count", CartItem, "recipe"),
+    (User, "recipes_count", Recipe, "author"),
+    (User, "followers_count", Subscription, "author"),
+)
+
+
+def count_related(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = "Пересчёт счётчиков избранного, корзин, рецептов и подписчиков"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fixed = 0
+        for model, counter, related, field in COUNTERS:
+            count = self.reconcile(
+                model, counter, related, field, options["batch_size"]
+            )
+            self.stdout.write(f"{model._meta.label}.{counter}: {count} fixed")
+            fixed += count
+        if fixed:
+            bump_version(namespace="recipes")
+
+    @staticmethod
+    def reconcile(model, counter, related, field, batch_size):
+        fixed = 0
+        ids = model.objects.order_by("pk").values_list("pk", flat=True)
+        for batch in batched(ids.iterator(), batch_size):
+            with transaction.atomic():
+                # Lock the rows first: a concurrent write blocks on its F()
+                # update until the corrected value is committed.
+                list(
+                    model.objects.select_for_update()
+                    .filter(pk__in=batch)
+                    .values_list("pk", flat=True)
+                )
+                drifted = (
+                    model.objects.filter(pk__in=batch)
+                    .annotate(actual=count_related(related, field))
+                    .exclude(**{counter: F("actual")})
+                    .values_list("pk", "actual")
+                )
+                objs = [
+                    model(pk=pk, **{counter: actual}) for pk, actual in drifted
+                ]
+                model.objects.bulk_update(objs, (counter,))
+            fixed += len(objs)
+        return fixed
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from app.models import TrendingRecipe, TrendingRefresh
+
+
+class Command(BaseCommand):
+    help = "Пересчёт рейтинга популярных рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Пересчитать рейтинг с начала окна",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            TrendingRecipe.objects.all().delete()
+            TrendingRefresh.objects.all().delete()
+        updated = TrendingRecipe.objects.refresh()
+        self.stdout.write(
+            f"recipes updated: {updated}, "
+            f"ranked: {TrendingRecipe.objects.count()}"
+        )
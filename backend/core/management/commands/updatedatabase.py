@@ -1,9 +1,13 @@
 import csv
+import itertools
+from collections import defaultdict
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from pytils.translit import slugify
 
 from app.models import (
     FavoriteRecipe,
@@ -14,6 +18,9 @@ from app.models import (
     Tag,
 )
 from cart.models import Cart, CartItem
+from core.bulk import BulkLoader, PasswordHasherPool, batched
+from core.cache import bump_version
+from core.search import normalize_search_text
 from users.models import Subscription
 
 User = get_user_model()
@@ -22,7 +29,36 @@ User = get_user_model()
 class Command(BaseCommand):
     help = "Заполнение базы данных из CSV файла"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Потоковая загрузка пачками через bulk_create",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Количество процессов для хеширования паролей",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="Загрузка через COPY в пустые таблицы PostgreSQL",
+        )
+
     def handle(self, *args, **options):
+        if options["bulk"]:
+            loader = BulkLoader(
+                stdout=self.stdout,
+                batch_size=options["batch_size"],
+                use_copy=options["copy"],
+            )
+            with PasswordHasherPool(workers=options["workers"]) as hasher:
+                bulk_processing(loader=loader, hasher=hasher)
+            loader.report()
+            return
         user_processing()
         subscription_processing()
         cart_processing()
@@ -324,3 +360,165 @@ def create_recipe_tags(recipe):
                     )
                     _object.full_clean()
                     _object.save()
+
+
+def read_csv(filename, header="id"):
+    with open(settings.CSV_ROOT + filename, newline="") as csvfile:
+        for row in csv.reader(csvfile, delimiter=";"):
+            if row and row[0].lower() != header:
+                yield row
+
+
+def group_by_recipe(filename, recipe_column, build):
+    """Read a recipe link CSV once and group its rows by recipe id"""
+    groups = defaultdict(list)
+    for row in read_csv(filename):
+        groups[int(row[recipe_column])].append(build(row))
+    return groups
+
+
+def bulk_users(hasher, batch_size):
+    """Build users, hashing plain passwords of each batch in parallel"""
+    for batch in batched(read_csv("users.csv"), batch_size):
+        passwords = hasher.hash([row[1] for row in batch])
+        for row, password in zip(batch, passwords):
+            yield build_user(row=row, password=password)
+
+
+def build_user(row, password):
+    is_superuser = int(row[3]) == 1
+    return User(
+        id=row[0],
+        password=password,
+        is_superuser=is_superuser,
+        is_staff=is_superuser,
+        username=row[7],
+        first_name=row[8],
+        last_name=row[9],
+        email=User.objects.normalize_email(row[10]),
+    )
+
+
+def bulk_recipes(loader):
+    ingredients = group_by_recipe(
+        "recipeingredients.csv",
+        recipe_column=2,
+        build=lambda row: RecipeIngredient(
+            id=row[0], ingredient_id=row[1], recipe_id=row[2], amount=row[3]
+        ),
+    )
+    tags = group_by_recipe(
+        "recipetags.csv",
+        recipe_column=1,
+        build=lambda row: RecipeTag(
+            id=row[0], recipe_id=row[1], tag_id=row[2]
+        ),
+    )
+    recipes = (
+        Recipe(
+            id=row[0],
+            name=row[1],
+            text=row[2],
+            cooking_time=row[3],
+            image=row[4],
+            author_id=row[5],
+        )
+        for row in read_csv("recipe.csv")
+    )
+    for batch in batched(recipes, loader.batch_size):
+        loaded = loader.load(model=Recipe, objects=batch)
+        loader.load(
+            model=RecipeIngredient,
+            objects=itertools.chain.from_iterable(
+                ingredients.pop(recipe_id, ()) for recipe_id in loaded
+            ),
+        )
+        loader.load(
+            model=RecipeTag,
+            objects=itertools.chain.from_iterable(
+                tags.pop(recipe_id, ()) for recipe_id in loaded
+            ),
+        )
+
+
+def bulk_processing(loader, hasher):
+    """Load every CSV file once, in batches, without per-row transactions"""
+    loader.load(
+        model=User,
+        objects=bulk_users(hasher=hasher, batch_size=loader.batch_size),
+    )
+    loader.load(
+        model=Subscription,
+        objects=(
+            Subscription(id=row[0], user_id=row[1], author_id=row[2])
+            for row in read_csv("subscription.csv")
+        ),
+    )
+    loader.load(
+        model=Cart,
+        objects=(
+            Cart(id=row[0], user_id=row[1]) for row in read_csv("cart.csv")
+        ),
+    )
+    loader.load(
+        model=Tag,
+        objects=(
+            Tag(
+                id=row[0],
+                name=row[1],
+                color=row[2].upper(),
+                slug=slugify(row[1]),
+            )
+            for row in read_csv("tag.csv")
+        ),
+    )
+    loader.load(
+        model=Ingredient,
+        objects=(
+            Ingredient(
+                id=number,
+                name=row[0],
+                measurement_unit=row[1],
+                search_name=normalize_search_text(row[0]),
+            )
+            for number, row in enumerate(
+                read_csv("ingredients.csv", header="name"), start=1
+            )
+        ),
+    )
+    bulk_recipes(loader=loader)
+    loader.load(
+        model=CartItem,
+        objects=(
+            CartItem(id=row[0], cart_id=row[1], recipe_id=row[2])
+            for row in read_csv("cart_item.csv")
+        ),
+    )
+    loader.load(
+        model=FavoriteRecipe,
+        objects=(
+            FavoriteRecipe(id=row[0], recipe_id=row[1], user_id=row[2])
+            for row in read_csv("favorite_recipe.csv")
+        ),
+    )
+    loader.reset_sequences(
+        User,
+        Subscription,
+        Cart,
+        Tag,
+        Ingredient,
+        Recipe,
+        RecipeIngredient,
+        RecipeTag,
+        CartItem,
+        FavoriteRecipe,
+    )
+    call_command("rebuildshoppinglists", stdout=loader.stdout)
+    call_command("reconcilecounters", stdout=loader.stdout)
+    for namespace in (
+        "recipes",
+        "tags",
+        "ingredients",
+        "recipe_ingredients",
+    ):
+        bump_version(namespace=namespace)
@@ -0,0 +1,118 @@
+import os
+
+from prometheus_client import (
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from core.authentication import token_cache
+from core.cache import get_cache_stats
+
+DURATION_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = {
+    "foodgram_request_duration_seconds": (
+        "Время обработки запроса",
+        DURATION_BUCKETS,
+    ),
+    "foodgram_db_duration_seconds": ("Время SQL-запросов", DURATION_BUCKETS),
+    "foodgram_view_excluding_sql_duration_seconds": (
+        "Время во view за вычетом SQL-запросов",
+        DURATION_BUCKETS,
+    ),
+    "foodgram_render_duration_seconds": (
+        "Время рендеринга ответа",
+        DURATION_BUCKETS,
+    ),
+    "foodgram_db_queries": ("Количество SQL-запросов", QUERY_BUCKETS),
+}
+CACHE_NAMESPACES = ("recipes",)
+
+
+class CacheStatsCollector:
+    """Response and token cache counters kept outside the histograms"""
+
+    def collect(self):
+        for event, documentation in (
+            ("hit", "Попадания в кеш ответов анонимным пользователям"),
+            ("miss", "Промахи кеша ответов анонимным пользователям"),
+        ):
+            counter = CounterMetricFamily(
+                f"foodgram_response_cache_{event}",
+                documentation,
+                labels=("namespace",),
+            )
+            for namespace in CACHE_NAMESPACES:
+                counter.add_metric(
+                    (namespace,), get_cache_stats(namespace=namespace)[event]
+                )
+            yield counter
+        stats = token_cache.stats()
+        lookups = CounterMetricFamily(
+            "foodgram_token_cache_lookups",
+            "Обращения к кешу токенов",
+            labels=("result",),
+        )
+        for event in ("hits", "misses"):
+            lookups.add_metric((event,), stats[event])
+        yield lookups
+        yield GaugeMetricFamily(
+            "foodgram_token_cache_hit_ratio",
+            "Доля попаданий в кеш токенов",
+            value=stats["hit_ratio"],
+        )
+
+
+class MetricsRegistry:
+    """Histograms per route in the Prometheus text format
+
+    Under gunicorn PROMETHEUS_MULTIPROC_DIR must point to a directory
+    shared by the workers: each worker then writes its samples there and
+    render() merges them, so any worker answers a scrape with the totals.
+    """
+
+    def __init__(self):
+        self.registry = CollectorRegistry()
+        self.histograms = {
+            name: Histogram(
+                name,
+                documentation,
+                ("route",),
+                buckets=buckets,
+                registry=self.registry,
+            )
+            for name, (documentation, buckets) in HISTOGRAMS.items()
+        }
+        self.cache_registry = CollectorRegistry()
+        self.cache_registry.register(CacheStatsCollector())
+
+    def observe(self, name, route, value):
+        self.histograms[name].labels(route=route).observe(value)
+
+    def render(self):
+        registry = self.registry
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return (
+            generate_latest(registry) + generate_latest(self.cache_registry)
+        ).decode()
+
+
+registry = MetricsRegistry()
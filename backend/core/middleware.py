@@ -0,0 +1,107 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from core.metrics import registry
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class ServerTimingMiddleware:
+    """Report SQL, view and render time in a Server-Timing header
+
+    The view entry is the time spent in the view minus its SQL time, that
+    is mostly queryset building and serialization.
+    Enabled with SERVER_TIMING_ENABLED; otherwise Django drops it at startup.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        request.server_timing = {}
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        finished = time.perf_counter()
+        marks = request.server_timing
+        view_started = marks.get("view_started", started)
+        view_finished = marks.get("view_finished", finished)
+        view_sql = marks.get("view_sql", timer.duration) - marks.get(
+            "view_started_sql", 0.0
+        )
+        timings = {
+            "db": timer.duration,
+            "view": max(view_finished - view_started - view_sql, 0.0),
+            "render": marks.get("render_finished", view_finished)
+            - view_finished,
+            "total": finished - started,
+        }
+        descriptions = {
+            "db": f"{timer.count} queries",
+            "view": "view minus SQL",
+        }
+        response["Server-Timing"] = ", ".join(
+            f"{name};dur={value * 1000:.1f}"
+            + (f';desc="{descriptions[name]}"' if name in descriptions else "")
+            for name, value in timings.items()
+        )
+        self.observe(request, timings, timer.count)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.server_timing["view_started"] = time.perf_counter()
+        request.server_timing["view_started_sql"] = self.sql_time()
+
+    def process_template_response(self, request, response):
+        marks = request.server_timing
+        marks["view_finished"] = time.perf_counter()
+        marks["view_sql"] = self.sql_time()
+
+        def render_finished(response):
+            marks["render_finished"] = time.perf_counter()
+
+        response.add_post_render_callback(render_finished)
+        return response
+
+    @staticmethod
+    def sql_time():
+        for wrapper in connection.execute_wrappers:
+            if isinstance(wrapper, QueryTimer):
+                return wrapper.duration
+        return 0.0
+
+    @staticmethod
+    def observe(request, timings, queries):
+        match = request.resolver_match
+        route = match.view_name if match else "unresolved"
+        registry.observe(
+            "foodgram_request_duration_seconds", route, timings["total"]
+        )
+        registry.observe("foodgram_db_duration_seconds", route, timings["db"])
+        registry.observe(
+            "foodgram_view_excluding_sql_duration_seconds",
+            route,
+            timings["view"],
+        )
+        registry.observe(
+            "foodgram_render_duration_seconds", route, timings["render"]
+        )
+        registry.observe("foodgram_db_queries", route, queries)
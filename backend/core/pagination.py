@@ -1,6 +1,62 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+CURSOR_ORDERING_FIELDS = ("created_at", "favorites_count", "cart_count", "id")
+
+
+class RecipeCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = "limit"
+    max_page_size = 100
+    ordering = ("-created_at", "id")
 
 
 class RecipePagination(PageNumberPagination):
+    """Page number pagination, or cursor pagination when ?cursor= is sent"""
+
     page_size = 6
     page_size_query_param = "limit"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = RecipeCursorPagination()
+            if queryset.query.order_by:
+                self.cursor_paginator.ordering = self.get_cursor_ordering(
+                    queryset.query.order_by
+                )
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view=view
+            )
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_cursor_ordering(self, ordering):
+        """Keep the filtered ordering when it is made of plain columns
+
+        The cursor encodes the value of the first column, so orderings by
+        expressions such as search relevance cannot be paged this way.
+        """
+        for field in ordering:
+            if (
+                not isinstance(field, str)
+                or field.lstrip("-") not in CURSOR_ORDERING_FIELDS
+            ):
+                raise ValidationError(
+                    {
+                        self.cursor_query_param: (
+                            "Такая сортировка не поддерживается "
+                            "курсорной пагинацией"
+                        )
+                    }
+                )
+        return tuple(ordering)
@@ -0,0 +1,56 @@
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+RECIPE_FTS_TABLE = "app_recipe_fts"
+
+# Per vendor: the match condition and the relevance (higher is better).
+# PostgreSQL reads the generated search_vector column, SQLite the FTS5
+# table, both created by app.signals.create_search_indexes.
+RECIPE_SEARCH = {
+    "postgresql": (
+        "{recipe}.search_vector @@ websearch_to_tsquery('russian', %s)",
+        "ts_rank_cd({recipe}.search_vector, "
+        "websearch_to_tsquery('russian', %s))",
+    ),
+    "sqlite": (
+        f"{{recipe}}.id IN (SELECT rowid FROM {RECIPE_FTS_TABLE} "
+        f"WHERE {RECIPE_FTS_TABLE} MATCH %s)",
+        f"(SELECT -bm25({RECIPE_FTS_TABLE}, 10.0, 1.0) "
+        f"FROM {RECIPE_FTS_TABLE} WHERE {RECIPE_FTS_TABLE} MATCH %s "
+        f"AND rowid = {{recipe}}.id)",
+    ),
+}
+
+
+def normalize_search_text(value):
+    """Lowercase the text and fold "ё" so Cyrillic matches on every DB"""
+    return " ".join(value.lower().replace("ё", "е").split())
+
+
+def to_fts5_query(value):
+    """Quote every word as a prefix term, FTS5 has no Russian stemmer"""
+    return " ".join(
+        '"{}"*'.format(word.replace('"', '""')) for word in value.split()
+    )
+
+
+def search_recipes(queryset, value):
+    """Filter recipes by a full-text query and annotate search_rank"""
+    value = normalize_search_text(value)
+    if not value:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor not in RECIPE_SEARCH:
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        ).annotate(search_rank=Value(0.0))
+    if vendor == "sqlite":
+        value = to_fts5_query(value)
+    match, rank = (
+        sql.format(recipe=queryset.model._meta.db_table)
+        for sql in RECIPE_SEARCH[vendor]
+    )
+    return queryset.filter(
+        RawSQL(match, (value,), output_field=BooleanField())
+    ).annotate(search_rank=RawSQL(rank, (value,), output_field=FloatField()))
@@ -1,13 +1,79 @@
 import base64
+import binascii
+import os
+import uuid
 
+from django.conf import settings
 from django.core.files.base import ContentFile
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from core.images import UPLOAD_EXTENSIONS, check_image_header
+
+
+def get_in_bulk(queryset, pks, fail):
+    """Return objects for the primary keys in order, with one query"""
+    ids = []
+    for pk in pks:
+        try:
+            ids.append(int(pk))
+        except (TypeError, ValueError):
+            fail("incorrect_type", data_type=type(pk).__name__)
+    objects = queryset.in_bulk(ids)
+    for pk in ids:
+        if pk not in objects:
+            fail("does_not_exist", pk_value=pk)
+    return [objects[pk] for pk in ids]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+        return get_in_bulk(
+            self.child_relation.get_queryset(), data, self.child_relation.fail
+        )
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField that loads a many=True list in one query"""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
 
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
             format, imgstr = data.split(";base64,")
-            ext = format.split("/")[-1]
-            data = ContentFile(base64.b64decode(imgstr), name=f"temp.{ext}")
+            if len(imgstr) * 3 // 4 > settings.IMAGE_MAX_UPLOAD_SIZE:
+                self.fail_too_large()
+            try:
+                content = base64.b64decode(imgstr, validate=True)
+            except binascii.Error:
+                self.fail("invalid_image")
+            data = ContentFile(content, name=uuid.uuid4().hex)
+        elif getattr(data, "size", 0) > settings.IMAGE_MAX_UPLOAD_SIZE:
+            self.fail_too_large()
+        if hasattr(data, "seek"):
+            # Name the file after its real format, not the declared one.
+            image_format = check_image_header(data)
+            extension = UPLOAD_EXTENSIONS.get(
+                image_format, image_format.lower()
+            )
+            data.name = f"{os.path.splitext(data.name)[0]}.{extension}"
         return super().to_internal_value(data)
+
+    @staticmethod
+    def fail_too_large():
+        raise serializers.ValidationError(
+            "Размер изображения не может превышать "
+            f"{settings.IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)} МБ"
+        )
@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -35,6 +36,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -88,6 +90,25 @@ DATABASES = {
     }
 }
 
+CACHE_LOCATION = os.getenv(
+    "CACHE_LOCATION",
+    "",
+)
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND",
+            "django.core.cache.backends.redis.RedisCache"
+            if CACHE_LOCATION
+            else "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": CACHE_LOCATION,
+    }
+}
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -114,6 +135,8 @@ USE_TZ = True
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+DEFAULT_FILE_STORAGE = "core.storage.ContentAddressedStorage"
+
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "static/")
 
@@ -127,6 +150,65 @@ LENGTH_OF_STRING = 40
 
 END_OF_STRING = "..."
 
+FOLLOWING_CACHE_TIMEOUT = 60 * 60
+
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+
+TAG_CACHE_TIMEOUT = 60 * 60
+
+TOKEN_CACHE_SIZE = 10000
+
+TOKEN_CACHE_TIMEOUT = 60 * 5
+
+TOKEN_CACHE_STATS_BATCH = 100
+
+TOKEN_CACHE_STATS_INTERVAL = 10
+
+# Revoked tokens are only dropped by every worker when the cache is shared.
+TOKEN_CACHE_ENABLED = (
+    os.getenv("TOKEN_CACHE_ENABLED", str(bool(CACHE_LOCATION))) == "True"
+)
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+INGREDIENT_COVERAGE_LIMIT = 300
+
+INGREDIENT_INDEX_DELTA_TIMEOUT = 60 * 60
+
+INGREDIENT_INDEX_MAX_DELTAS = 1000
+
+PDF_FONT_PATH = os.path.join(BASE_DIR, "media/fonts/DejaVuSerif.ttf")
+
+PDF_CACHE_TIMEOUT = 60 * 60
+
+IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
+IMAGE_MAX_DIMENSION = 6000
+
+IMAGE_ALLOWED_FORMATS = ("JPEG", "PNG", "WEBP", "GIF")
+
+IMAGE_RENDITIONS = {"thumbnail": (160, 120), "card": (480, 360)}
+
+IMAGE_QUALITY = 80
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+
+TRENDING_HALF_LIFE = timedelta(days=2)
+
+TRENDING_WINDOW = timedelta(days=7)
+
+TRENDING_LAG = timedelta(minutes=1)
+
+TRENDING_FAVORITE_WEIGHT = 1.0
+
+TRENDING_CART_WEIGHT = 0.5
+
+TRENDING_MIN_SCORE = 0.01
+
+TRENDING_LIMIT = 20
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "False") == "True"
+
 CORS_URLS_REGEX = r"^/api/.*$"
 
 CORS_ALLOWED_ORIGINS = [
@@ -141,7 +223,7 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 6,
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
+        "core.authentication.CachedTokenAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
@@ -1,4 +1,16 @@
 #!/bin/bash
+set -e
+
+export WEB_CONCURRENCY=${WEB_CONCURRENCY:-5}
+# Workers share metric samples through files in this directory.
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
 
 python manage.py collectstatic --noinput && python manage.py makemigrations app cart users && python manage.py migrate
-gunicorn --bind 0:8000 --workers=5 --threads=2 foodgram.wsgi:application
\ No newline at end of file
+# A full recount of the popularity counters. Run it once after the upgrade
+# that adds them or on a schedule, not on every start.
+if [ "${RECONCILE_COUNTERS:-False}" = "True" ]; then
+    python manage.py reconcilecounters
+fi
+gunicorn --bind 0:8000 --threads=2 foodgram.wsgi:application
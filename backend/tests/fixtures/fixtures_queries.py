@@ -0,0 +1,14 @@
+import pytest
+
+from tests.queries import QueryShapeDetector
+
+
+@pytest.fixture
+def n_plus_one(request):
+    with QueryShapeDetector() as detector:
+        yield detector
+    # Shown by pytest for failures, and for passing tests with -rP.
+    request.node.add_report_section(
+        "teardown", "query shapes", detector.summary()
+    )
+    detector.check()
@@ -0,0 +1,109 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from app.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def author(django_user_model):
+    return django_user_model.objects.create_user(
+        email="author@email.ru",
+        password="password",
+        first_name="author",
+        last_name="author",
+        username="author",
+    )
+
+
+@pytest.fixture
+def reader(django_user_model):
+    return django_user_model.objects.create_user(
+        email="reader@email.ru",
+        password="password",
+        first_name="reader",
+        last_name="reader",
+        username="reader",
+    )
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name="Завтрак", color="#000000", slug="breakfast"),
+        Tag.objects.create(name="Обед", color="#000001", slug="lunch"),
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(name="абрикос", measurement_unit="г"),
+        Ingredient.objects.create(name="молоко", measurement_unit="мл"),
+        Ingredient.objects.create(name="яйца", measurement_unit="шт"),
+    ]
+
+
+@pytest.fixture
+def create_recipes(author, tags, ingredients):
+    def make_recipes(count, user=None):
+        recipes = []
+        for _ in range(count):
+            recipe = Recipe.objects.create(
+                name=f"recipe {Recipe.objects.count()}",
+                text="text",
+                cooking_time=10,
+                image="images/borsch.jpg",
+                author=user or author,
+            )
+            for tag in tags:
+                RecipeTag.objects.create(recipe=recipe, tag=tag)
+            for amount, ingredient in enumerate(ingredients, start=1):
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=amount
+                )
+            recipes.append(recipe)
+        return recipes
+
+    return make_recipes
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+@pytest.fixture
+def image():
+    return (
+        "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywa"
+        "AAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQV"
+        "QImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg=="
+    )
+
+
+@pytest.fixture
+def author_client(author):
+    client = APIClient()
+    client.force_authenticate(user=author)
+    return client
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def reader_client(reader):
+    client = APIClient()
+    client.force_authenticate(user=reader)
+    return client
@@ -0,0 +1,128 @@
+import functools
+import os
+import re
+import sys
+from collections import defaultdict
+
+from django.core.signals import request_started
+from django.db import connection
+from rest_framework.serializers import Serializer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESTS_DIR = os.path.join(BACKEND_DIR, "tests")
+
+LITERALS = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\((?:\s*\?\s*,)*\s*\?\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def fingerprint(sql):
+    """Replace literals and parameter lists so equal query shapes match"""
+    for pattern, replacement in LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def find_trigger(frame):
+    """Name the serializer field or project code that ran the query"""
+    location = None
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if (
+            location is None
+            and path.startswith(BACKEND_DIR)
+            and not path.startswith(TESTS_DIR)
+        ):
+            location = (
+                f"{os.path.relpath(path, BACKEND_DIR)}:{frame.f_lineno} "
+                f"in {frame.f_code.co_name}"
+            )
+        serializer = frame.f_locals.get("self")
+        field = frame.f_locals.get("field")
+        if (
+            frame.f_code.co_name == "to_representation"
+            and isinstance(serializer, Serializer)
+            and getattr(field, "field_name", None)
+        ):
+            name = f"{type(serializer).__name__}.{field.field_name}"
+            return f"{name} ({location})" if location else name
+        frame = frame.f_back
+    return location or "unknown"
+
+
+class QueryShapeDetector:
+    """Fail when one query shape runs more than `limit` times per request"""
+
+    def __init__(self, limit=2):
+        self.limit = limit
+        self.requests = []
+
+    def __enter__(self):
+        request_started.connect(self.start_request)
+        self.wrapper = connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        self.start_request()
+        return self
+
+    def __exit__(self, *args):
+        self.wrapper.__exit__(*args)
+        request_started.disconnect(self.start_request)
+
+    def start_request(self, **kwargs):
+        self.requests.append(defaultdict(list))
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = fingerprint(sql)
+        self.requests[-1][shape].append(find_trigger(sys._getframe(1)))
+        return execute(sql, params, many, context)
+
+    def repeats(self):
+        return [
+            (shape, triggers)
+            for shapes in self.requests
+            for shape, triggers in shapes.items()
+            if len(triggers) > self.limit
+        ]
+
+    def report(self):
+        lines = []
+        for shape, triggers in self.repeats():
+            lines.append(f"{len(triggers)} x {shape}")
+            for trigger in sorted(set(triggers)):
+                lines.append(f"    {triggers.count(trigger)} x {trigger}")
+        return "\n".join(lines)
+
+    def summary(self):
+        """Queries per request followed by the repeated shapes"""
+        lines = []
+        for number, shapes in enumerate(self.requests):
+            name = f"request {number}" if number else "outside requests"
+            lines.append(
+                f"{name}: {sum(map(len, shapes.values()))} queries, "
+                f"{len(shapes)} shapes"
+            )
+        report = self.report()
+        return "\n".join(lines + ([report] if report else []))
+
+    def check(self):
+        assert not self.repeats(), "Repeated queries:\n" + self.report()
+
+
+def no_n_plus_one(limit=2):
+    """Decorate a test to fail on repeated query shapes in any request"""
+
+    def decorator(test):
+        @functools.wraps(test)
+        def wrapper(*args, **kwargs):
+            with QueryShapeDetector(limit) as detector:
+                result = test(*args, **kwargs)
+            detector.check()
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,937 @@
+import io
+import os
+import sqlite3
+import subprocess
+import sys
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.serializers import RecipeCreateSerializer, RecipeSerializer
+from app.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Tag,
+    TrendingRecipe,
+)
+from cart.models import Cart, CartIngredient, CartItem
+from core.bitmap import RoaringBitmap
+from core.cache import get_cache_stats, get_following_ids, get_version
+from core.ingredient_index import IngredientIndex, ingredient_index
+from tests.queries import QueryShapeDetector
+from users.models import Subscription
+
+
+class TestRecipeList:
+    @staticmethod
+    def count_queries(client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        assert response.status_code == 200
+        return len(context.captured_queries)
+
+    @pytest.mark.django_db
+    def test_list_queries_do_not_depend_on_page_size(
+        self, reader_client, create_recipes
+    ):
+        create_recipes(2)
+        small_page = self.count_queries(reader_client, "/api/recipes/")
+        create_recipes(8)
+        large_page = self.count_queries(
+            reader_client, "/api/recipes/?limit=10"
+        )
+        assert small_page == large_page, (
+            "Количество запросов к базе данных растёт "
+            "вместе с количеством рецептов на странице"
+        )
+
+    @pytest.mark.django_db
+    def test_viewer_flags(self, reader, author, reader_client, create_recipes):
+        favorite, other = create_recipes(2)
+        FavoriteRecipe.objects.create(user=reader, recipe=favorite)
+        Subscription.objects.create(user=reader, author=author)
+        response = reader_client.get("/api/recipes/")
+        flags = {
+            recipe["id"]: recipe["is_favorited"]
+            for recipe in response.data["results"]
+        }
+        assert flags == {favorite.id: True, other.id: False}
+        assert all(
+            recipe["author"]["is_subscribed"]
+            for recipe in response.data["results"]
+        )
+
+
+class TestRecipePagination:
+    @pytest.mark.django_db
+    def test_cursor_mode(self, api_client, create_recipes):
+        recipes = create_recipes(3)
+        response = api_client.get("/api/recipes/?cursor=&limit=2")
+        assert response.status_code == 200
+        assert "count" not in response.data
+        assert [recipe["id"] for recipe in response.data["results"]] == [
+            recipes[2].id,
+            recipes[1].id,
+        ]
+        response = api_client.get(response.data["next"])
+        assert [recipe["id"] for recipe in response.data["results"]] == [
+            recipes[0].id,
+        ]
+        assert response.data["next"] is None
+
+    @pytest.mark.django_db
+    def test_cursor_mode_keeps_ordering(self, api_client, create_recipes):
+        recipes = create_recipes(3)
+        Recipe.objects.filter(pk=recipes[0].pk).update(favorites_count=2)
+        Recipe.objects.filter(pk=recipes[1].pk).update(favorites_count=1)
+        response = api_client.get(
+            "/api/recipes/?cursor=&limit=2&ordering=-favorites_count"
+        )
+        assert [recipe["id"] for recipe in response.data["results"]] == [
+            recipes[0].id,
+            recipes[1].id,
+        ]
+        response = api_client.get(response.data["next"])
+        assert [recipe["id"] for recipe in response.data["results"]] == [
+            recipes[2].id,
+        ]
+
+    @pytest.mark.django_db
+    def test_cursor_mode_rejects_search_ordering(
+        self, api_client, create_recipes
+    ):
+        create_recipes(1)
+        response = api_client.get("/api/recipes/?cursor=&search=recipe")
+        assert response.status_code == 400
+        assert "cursor" in response.data
+
+    @pytest.mark.django_db
+    def test_page_size_is_bounded(self, api_client, create_recipes):
+        create_recipes(1)
+        response = api_client.get("/api/recipes/?limit=100000")
+        assert response.status_code == 200
+        assert response.data["count"] == 1
+
+
+class TestUserSubscriptionStatus:
+    @pytest.mark.django_db
+    def test_following_cache_is_invalidated(
+        self, reader, author, reader_client
+    ):
+        url = f"/api/users/{author.id}/"
+        assert reader_client.get(url).data["is_subscribed"] is False
+        assert author.id not in get_following_ids(user=reader)
+        Subscription.objects.create(user=reader, author=author)
+        assert reader_client.get(url).data["is_subscribed"] is True
+        assert author.id in get_following_ids(user=reader)
+        Subscription.objects.filter(user=reader, author=author).delete()
+        assert reader_client.get(url).data["is_subscribed"] is False
+        assert author.id not in get_following_ids(user=reader)
+
+
+class TestAnonymousRecipeCache:
+    @pytest.mark.django_db
+    def test_cached_response_is_invalidated(self, api_client, create_recipes):
+        recipe, *_ = create_recipes(1)
+        url = "/api/recipes/?limit=6&tags=breakfast"
+        api_client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get("/api/recipes/?tags=breakfast&limit=6")
+        assert len(context.captured_queries) == 0
+        assert response.data["results"][0]["name"] == recipe.name
+        assert get_cache_stats(namespace="recipes") == {"hit": 1, "miss": 1}
+        recipe.name = "new name"
+        recipe.save()
+        response = api_client.get(url)
+        assert response.data["results"][0]["name"] == "new name"
+
+
+class TestCatalogSnapshot:
+    @pytest.mark.django_db
+    def test_etag(self, api_client, tags):
+        response = api_client.get("/api/tags/")
+        assert len(response.json()) == len(tags)
+        etag = response["ETag"]
+        response = api_client.get("/api/tags/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        Tag.objects.create(name="Ужин", color="#000002", slug="dinner")
+        response = api_client.get("/api/tags/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert len(response.json()) == len(tags) + 1
+
+    @pytest.mark.django_db
+    def test_etag_per_encoding(self, api_client, tags):
+        plain = api_client.get("/api/tags/")
+        gzipped = api_client.get("/api/tags/", HTTP_ACCEPT_ENCODING="gzip")
+        assert gzipped["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in gzipped["Vary"]
+        assert gzipped["ETag"] != plain["ETag"]
+        response = api_client.get(
+            "/api/tags/",
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=plain["ETag"],
+        )
+        assert response.status_code == 200
+        response = api_client.get(
+            "/api/tags/",
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=gzipped["ETag"],
+        )
+        assert response.status_code == 304
+        assert response["ETag"] == gzipped["ETag"]
+
+
+class TestIngredientSearch:
+    @pytest.mark.django_db
+    def test_prefix_matches_first(self, api_client):
+        for name in ("сок апельсиновый", "Апельсин", "мёд", "персик"):
+            Ingredient.objects.create(name=name, measurement_unit="г")
+        response = api_client.get("/api/ingredients/?name=АПЕЛЬС")
+        assert [item["name"] for item in response.data] == [
+            "Апельсин",
+            "сок апельсиновый",
+        ]
+        response = api_client.get("/api/ingredients/?name=мед")
+        assert [item["name"] for item in response.data] == ["мёд"]
+        response = api_client.get("/api/ingredients/?name=(а+)+$")
+        assert response.data == []
+
+
+class TestRecipeWrite:
+    # Lookups, uniqueness check, writes, counters and the reloaded recipe.
+    CREATE_QUERIES = 13
+    # Plus get_object() and the link diff: one select, delete and insert
+    # per link table.
+    UPDATE_QUERIES = 20
+
+    @pytest.mark.django_db
+    def test_update_writes_only_changed_links(
+        self,
+        author_client,
+        tags,
+        ingredients,
+        image,
+        media_root,
+        django_assert_num_queries,
+    ):
+        breakfast, lunch = tags
+        apricot, milk, eggs = ingredients
+        data = {
+            "name": "Омлет",
+            "text": "text",
+            "cooking_time": 10,
+            "image": image,
+            "tags": [breakfast.id],
+            "ingredients": [
+                {"id": apricot.id, "amount": 1},
+                {"id": milk.id, "amount": 2},
+            ],
+        }
+        with django_assert_num_queries(self.CREATE_QUERIES):
+            response = author_client.post("/api/recipes/", data, format="json")
+        assert response.status_code == 201
+        recipe_id = response.data["id"]
+        kept_link = RecipeIngredient.objects.get(
+            recipe_id=recipe_id, ingredient=apricot
+        )
+        data["tags"] = [lunch.id]
+        data["ingredients"] = [
+            {"id": apricot.id, "amount": 1},
+            {"id": eggs.id, "amount": 3},
+        ]
+        with django_assert_num_queries(self.UPDATE_QUERIES):
+            response = author_client.put(
+                f"/api/recipes/{recipe_id}/", data, format="json"
+            )
+        assert response.status_code == 200
+        assert [tag["id"] for tag in response.data["tags"]] == [lunch.id]
+        assert {
+            (item["id"], item["amount"])
+            for item in response.data["ingredients"]
+        } == {(apricot.id, 1), (eggs.id, 3)}
+        assert RecipeIngredient.objects.filter(pk=kept_link.pk).exists()
+
+    @pytest.mark.django_db
+    def test_create_cost_does_not_grow_with_links(
+        self,
+        author_client,
+        tags,
+        ingredients,
+        image,
+        media_root,
+        django_assert_num_queries,
+    ):
+        data = {
+            "name": "Омлет",
+            "text": "text",
+            "cooking_time": 10,
+            "image": image,
+            "tags": [tag.id for tag in tags],
+            "ingredients": [
+                {"id": ingredient.id, "amount": amount}
+                for amount, ingredient in enumerate(ingredients, start=1)
+            ],
+        }
+        with django_assert_num_queries(self.CREATE_QUERIES):
+            response = author_client.post("/api/recipes/", data, format="json")
+        assert response.status_code == 201
+        assert len(response.data["ingredients"]) == len(ingredients)
+
+    @pytest.mark.django_db
+    def test_unknown_ingredient_is_rejected(
+        self, author_client, tags, ingredients, image, media_root
+    ):
+        data = {
+            "name": "Омлет",
+            "text": "text",
+            "cooking_time": 10,
+            "image": image,
+            "tags": [tags[0].id],
+            "ingredients": [{"id": ingredients[0].id + 1000, "amount": 1}],
+        }
+        response = author_client.post("/api/recipes/", data, format="json")
+        assert response.status_code == 400
+        assert "ingredients" in response.data
+
+
+class TestRecipeImages:
+    @pytest.fixture
+    def data(self, tags, ingredients, image):
+        return {
+            "name": "Омлет",
+            "text": "text",
+            "cooking_time": 10,
+            "image": image,
+            "tags": [tags[0].id],
+            "ingredients": [{"id": ingredients[0].id, "amount": 1}],
+        }
+
+    @pytest.mark.django_db
+    def test_renditions_are_built_after_commit(
+        self,
+        settings,
+        author_client,
+        data,
+        media_root,
+        django_capture_on_commit_callbacks,
+    ):
+        settings.IMAGE_WORKERS = 0
+        with django_capture_on_commit_callbacks(execute=True):
+            response = author_client.post("/api/recipes/", data, format="json")
+        assert response.status_code == 201
+        assert "temp" not in response.data["image"]
+        response = author_client.get(f"/api/recipes/{response.data['id']}/")
+        renditions = response.data["image_renditions"]
+        assert set(renditions) == set(settings.IMAGE_RENDITIONS)
+        card = renditions["card"]["webp"].split("/media/")[-1]
+        with Image.open(media_root / card) as rendition:
+            assert rendition.format == "WEBP"
+            assert rendition.size == settings.IMAGE_RENDITIONS["card"]
+
+    @pytest.mark.django_db
+    def test_identical_uploads_share_a_blob(
+        self, author_client, data, media_root
+    ):
+        first = author_client.post("/api/recipes/", data, format="json")
+        data["name"] = "Яичница"
+        second = author_client.post("/api/recipes/", data, format="json")
+        assert first.data["image"] == second.data["image"]
+        orphan = default_storage.save("images/orphan.txt", ContentFile(b"x"))
+        call_command("cleanmedia", min_age=0, stdout=io.StringIO())
+        assert not default_storage.exists(orphan)
+        blobs = [path for path in media_root.rglob("*") if path.is_file()]
+        assert len(blobs) == 1
+        assert first.data["image"].endswith(blobs[0].name)
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize(
+        "limit", ("IMAGE_MAX_DIMENSION", "IMAGE_MAX_UPLOAD_SIZE")
+    )
+    def test_limits(self, settings, author_client, data, media_root, limit):
+        setattr(settings, limit, 0)
+        response = author_client.post("/api/recipes/", data, format="json")
+        assert response.status_code == 400
+        assert "image" in response.data
+
+    @pytest.mark.django_db
+    def test_extension_follows_the_content(
+        self, author_client, data, media_root
+    ):
+        data["image"] = data["image"].replace("image/png", "image/gif")
+        response = author_client.post("/api/recipes/", data, format="json")
+        assert response.status_code == 201
+        assert response.data["image"].endswith(".png")
+
+
+class TestShoppingList:
+    @pytest.mark.django_db
+    def test_totals_follow_cart_and_recipe_changes(
+        self, reader_client, create_recipes
+    ):
+        first, second = create_recipes(2)
+        for recipe in (first, second):
+            response = reader_client.post(
+                f"/api/recipes/{recipe.id}/shopping_cart/"
+            )
+            assert response.status_code == 200
+        response = reader_client.get("/api/recipes/shopping_list/")
+        assert [item["amount"] for item in response.data] == [2, 4, 6]
+        link = first.recipeingredient_set.order_by("ingredient__name")[0]
+        RecipeCreateSerializer._update_links(
+            recipe=first,
+            tags=first.tags.all(),
+            ingredients=[{"ingredient": link.ingredient, "amount": 10}],
+        )
+        response = reader_client.get("/api/recipes/shopping_list/")
+        assert [item["amount"] for item in response.data] == [11, 2, 3]
+        call_command("rebuildshoppinglists", stdout=io.StringIO())
+        response = reader_client.get("/api/recipes/shopping_list/")
+        assert [item["amount"] for item in response.data] == [11, 2, 3]
+        reader_client.delete(f"/api/recipes/{second.id}/shopping_cart/")
+        response = reader_client.get("/api/recipes/shopping_list/")
+        assert [item["amount"] for item in response.data] == [10]
+
+    @pytest.mark.django_db
+    def test_totals_follow_link_model_writes(
+        self, reader, reader_client, create_recipes
+    ):
+        first, second = create_recipes(2)
+        for recipe in (first, second):
+            reader_client.post(f"/api/recipes/{recipe.id}/shopping_cart/")
+
+        def amounts():
+            response = reader_client.get("/api/recipes/shopping_list/")
+            return [item["amount"] for item in response.data]
+
+        link = first.recipeingredient_set.order_by("ingredient__name")[0]
+        link.amount = 5
+        link.save()
+        assert amounts() == [6, 4, 6]
+        link.delete()
+        assert amounts() == [1, 4, 6]
+        RecipeIngredient.objects.create(
+            recipe=first, ingredient=link.ingredient, amount=7
+        )
+        assert amounts() == [8, 4, 6]
+        first.delete()
+        assert amounts() == [1, 2, 3]
+        call_command("rebuildshoppinglists", stdout=io.StringIO())
+        assert amounts() == [1, 2, 3]
+
+
+class TestShoppingCartPdf:
+    @pytest.mark.django_db
+    def test_long_list_is_paginated_and_cached(
+        self, reader, reader_client, create_recipes
+    ):
+        recipes = create_recipes(60)
+        cart = Cart.objects.create(user=reader)
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, recipe=recipe) for recipe in recipes
+        )
+        CartIngredient.objects.rebuild(cart_ids=[cart.id])
+        url = "/api/recipes/download_shopping_cart/"
+        content = b"".join(reader_client.get(url).streaming_content)
+        assert content.count(b"/Type /Page\n") > 1
+        with CaptureQueriesContext(connection) as context:
+            cached = b"".join(reader_client.get(url).streaming_content)
+        assert cached == content
+        assert len(context.captured_queries) == 1
+
+
+class TestSubscriptions:
+    @pytest.mark.django_db
+    def test_recipes_limit(
+        self, reader, author, reader_client, create_recipes
+    ):
+        recipes = create_recipes(3)
+        Subscription.objects.create(user=reader, author=author)
+        with CaptureQueriesContext(connection) as context:
+            response = reader_client.get(
+                "/api/users/subscriptions/?recipes_limit=2"
+            )
+        assert len(context.captured_queries) == 3
+        (subscription,) = response.data["results"]
+        assert subscription["is_subscribed"] is True
+        assert subscription["recipes_count"] == 3
+        assert [recipe["id"] for recipe in subscription["recipes"]] == [
+            recipes[2].id,
+            recipes[1].id,
+        ]
+
+    @pytest.mark.django_db
+    def test_recipes_limit_without_subscriptions(self, reader_client):
+        response = reader_client.get(
+            "/api/users/subscriptions/?recipes_limit=3"
+        )
+        assert response.status_code == 200
+        assert response.data["results"] == []
+
+
+class TestCounters:
+    @pytest.mark.django_db
+    def test_counters_follow_writes(
+        self, author, reader, reader_client, create_recipes
+    ):
+        first, second = create_recipes(2)
+        reader_client.post(f"/api/recipes/{first.id}/favorite/")
+        reader_client.post(f"/api/recipes/{first.id}/shopping_cart/")
+        reader_client.post(f"/api/recipes/{second.id}/shopping_cart/")
+        reader_client.post(f"/api/users/{author.id}/subscribe/")
+        first.refresh_from_db()
+        author.refresh_from_db()
+        assert (first.favorites_count, first.cart_count) == (1, 1)
+        assert (author.recipes_count, author.followers_count) == (2, 1)
+        reader_client.delete(f"/api/recipes/{first.id}/favorite/")
+        second.delete()
+        first.refresh_from_db()
+        author.refresh_from_db()
+        assert first.favorites_count == 0
+        assert author.recipes_count == 1
+
+    @pytest.mark.django_db
+    def test_decrement_from_zero(
+        self, author, reader_client, create_recipes, django_user_model
+    ):
+        # Rows created before the counter columns existed start at zero.
+        (recipe,) = create_recipes(1)
+        reader_client.post(f"/api/recipes/{recipe.id}/favorite/")
+        reader_client.post(f"/api/recipes/{recipe.id}/shopping_cart/")
+        reader_client.post(f"/api/users/{author.id}/subscribe/")
+        Recipe.objects.update(favorites_count=0, cart_count=0)
+        django_user_model.objects.update(recipes_count=0, followers_count=0)
+        for url in (
+            f"/api/recipes/{recipe.id}/favorite/",
+            f"/api/recipes/{recipe.id}/shopping_cart/",
+            f"/api/users/{author.id}/subscribe/",
+        ):
+            assert reader_client.delete(url).status_code == 204
+        recipe.delete()
+        author.refresh_from_db()
+        assert (author.recipes_count, author.followers_count) == (0, 0)
+
+    @pytest.mark.django_db
+    def test_ordering_and_reconcile(self, reader, api_client, create_recipes):
+        first, second = create_recipes(2)
+        FavoriteRecipe.objects.create(user=reader, recipe=first)
+        response = api_client.get("/api/recipes/?ordering=-favorites_count")
+        assert [recipe["id"] for recipe in response.data["results"]] == [
+            first.id,
+            second.id,
+        ]
+        assert response.data["results"][0]["favorites_count"] == 1
+        Recipe.objects.filter(pk=second.pk).update(favorites_count=5)
+        output = io.StringIO()
+        call_command("reconcilecounters", batch_size=1, stdout=output)
+        assert "app.Recipe.favorites_count: 1 fixed" in output.getvalue()
+        second.refresh_from_db()
+        assert second.favorites_count == 0
+
+
+class TestTrending:
+    @pytest.mark.django_db
+    def test_refresh_is_incremental_and_decays(
+        self, settings, author, reader, api_client, tags, create_recipes
+    ):
+        first, second, third = create_recipes(3)
+        third.tags.set([tags[0]])
+        now = timezone.now()
+        FavoriteRecipe.objects.create(
+            user=author, recipe=first, created_at=now - timedelta(days=3)
+        )
+        FavoriteRecipe.objects.create(
+            user=reader, recipe=second, created_at=now - timedelta(hours=1)
+        )
+        cart = Cart.objects.create(user=reader)
+        CartItem.objects.create(
+            cart=cart, recipe=third, created_at=now - timedelta(hours=1)
+        )
+        TrendingRecipe.objects.refresh(now=now)
+        response = api_client.get("/api/recipes/trending/")
+        assert [recipe["id"] for recipe in response.data] == [
+            second.id,
+            third.id,
+            first.id,
+        ]
+        response = api_client.get("/api/recipes/trending/?tags=lunch")
+        assert [recipe["id"] for recipe in response.data] == [
+            second.id,
+            first.id,
+        ]
+        later = now + settings.TRENDING_HALF_LIFE
+        FavoriteRecipe.objects.create(
+            user=reader, recipe=first, created_at=later - timedelta(hours=1)
+        )
+        assert TrendingRecipe.objects.refresh(now=later) == 1
+        scores = dict(TrendingRecipe.objects.values_list("recipe_id", "score"))
+        assert scores[second.id] == pytest.approx(0.5 * 0.5 ** (1 / 48))
+        assert scores[first.id] > scores[second.id]
+
+
+class TestRecipeSearch:
+    @pytest.mark.django_db
+    def test_ranked_and_combined_with_filters(
+        self, reader, reader_client, create_recipes
+    ):
+        soup, salad, pie = create_recipes(3)
+        Recipe.objects.filter(pk=soup.pk).update(
+            name="Красный борщ", text="Свёкла и капуста"
+        )
+        salad.text = "Подавать после борща"
+        salad.save()
+        pie.name = "Пирог"
+        pie.save()
+        response = reader_client.get("/api/recipes/?search=БОРЩ")
+        assert [recipe["id"] for recipe in response.data["results"]] == [
+            soup.id,
+            salad.id,
+        ]
+        response = reader_client.get("/api/recipes/?search=свекла")
+        assert [recipe["id"] for recipe in response.data["results"]] == [
+            soup.id
+        ]
+        FavoriteRecipe.objects.create(user=reader, recipe=salad)
+        response = reader_client.get(
+            "/api/recipes/?search=борщ&is_favorited=1"
+        )
+        assert [recipe["id"] for recipe in response.data["results"]] == [
+            salad.id
+        ]
+
+
+class TestIngredientIndex:
+    @staticmethod
+    def ids(response):
+        return [recipe["id"] for recipe in response.data["results"]]
+
+    @pytest.mark.django_db
+    def test_include_exclude_and_coverage(
+        self,
+        api_client,
+        ingredients,
+        create_recipes,
+        monkeypatch,
+        django_capture_on_commit_callbacks,
+    ):
+        apricot, milk, eggs = ingredients
+        full, no_eggs, only_milk, deleted = create_recipes(4)
+        url = "/api/recipes/?ingredients={}&exclude_ingredients={}"
+        response = api_client.get(url.format(milk.id, ""))
+        assert response.data["count"] == 4
+
+        def build():
+            raise AssertionError("The index was rebuilt from scratch")
+
+        monkeypatch.setattr(IngredientIndex, "build", staticmethod(build))
+        with django_capture_on_commit_callbacks(execute=True):
+            no_eggs.recipeingredient_set.filter(ingredient=eggs).delete()
+            only_milk.recipeingredient_set.exclude(ingredient=milk).delete()
+            deleted.delete()
+        response = api_client.get(url.format(milk.id, eggs.id))
+        assert sorted(self.ids(response)) == [no_eggs.id, only_milk.id]
+        response = api_client.get(url.format(f"{apricot.id},{milk.id}", ""))
+        assert sorted(self.ids(response)) == [full.id, no_eggs.id]
+        response = api_client.get(
+            f"/api/recipes/?ingredients={milk.id},{eggs.id}&coverage=1"
+        )
+        assert self.ids(response) == [only_milk.id, full.id, no_eggs.id]
+        with django_capture_on_commit_callbacks(execute=True):
+            RecipeCreateSerializer._update_links(
+                recipe=only_milk,
+                tags=only_milk.tags.all(),
+                ingredients=[{"ingredient": eggs, "amount": 1}],
+            )
+            RecipeIngredient.objects.create(
+                recipe=no_eggs, ingredient=eggs, amount=1
+            )
+        response = api_client.get(url.format(milk.id, ""))
+        assert sorted(self.ids(response)) == [full.id, no_eggs.id]
+        response = api_client.get(url.format(eggs.id, ""))
+        assert response.data["count"] == 3
+
+    @pytest.mark.django_db
+    def test_missing_delta_rebuilds(
+        self, api_client, ingredients, create_recipes
+    ):
+        _, milk, _ = ingredients
+        (recipe,) = create_recipes(1)
+        url = f"/api/recipes/?ingredients={milk.id}"
+        assert api_client.get(url).data["count"] == 1
+        # The links go away while the delta expires before it is read.
+        recipe.recipeingredient_set.all().delete()
+        ingredient_index.send(recipe.id, None, frozenset())
+        ingredient_index.send(recipe.id, frozenset(), frozenset())
+        cache.delete(
+            ingredient_index.delta_key(get_version("recipe_ingredients"), 1)
+        )
+        assert api_client.get(url).data["count"] == 0
+
+    @pytest.mark.django_db
+    def test_large_match_uses_one_parameter(
+        self, api_client, author, ingredients
+    ):
+        apricot, milk, _ = ingredients
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                name=f"recipe {number}",
+                text="text",
+                cooking_time=10,
+                image="images/borsch.jpg",
+                author=author,
+            )
+            for number in range(300)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=milk, amount=1)
+            for recipe in recipes
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=apricot, amount=1)
+            for recipe in recipes[::2]
+        )
+        url = "/api/recipes/?ingredients={}&exclude_ingredients={}"
+        connection.ensure_connection()
+        sqlite = getattr(connection.connection, "setlimit", None)
+        if sqlite is not None:
+            # Lower than the match so an IN list of ids would fail.
+            limit = sqlite(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 100)
+        try:
+            response = api_client.get(url.format(milk.id, apricot.id))
+            assert response.data["count"] == 150
+            response = api_client.get(url.format("", milk.id))
+            assert response.data["count"] == 0
+        finally:
+            if sqlite is not None:
+                sqlite(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
+
+    def test_bitmap_operations(self):
+        left = RoaringBitmap.from_ids([1, 70000, *range(100, 5200)])
+        right = RoaringBitmap.from_ids([1, 2, 70000, 70001, 5000])
+        assert list(left & right) == [1, 5000, 70000]
+        assert list(right - left) == [2, 70001]
+        assert len(left | right) == len(left) + 2
+
+
+class TestTagFilter:
+    @pytest.mark.django_db
+    def test_no_duplicates_and_cached_slugs(self, api_client, create_recipes):
+        (recipe,) = create_recipes(1)
+        url = "/api/recipes/?tags=breakfast&tags=lunch"
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(url)
+        assert response.data["count"] == 1
+        assert [item["id"] for item in response.data["results"]] == [recipe.id]
+        slug_map = 'SELECT "app_tag"."slug", "app_tag"."id" FROM "app_tag"'
+        with CaptureQueriesContext(connection) as context:
+            api_client.get("/api/recipes/?tags=lunch")
+        assert not any(
+            query["sql"].startswith(slug_map)
+            for query in context.captured_queries
+        )
+        response = api_client.get("/api/recipes/?tags=dinner")
+        assert response.status_code == 400
+
+
+class TestServerTiming:
+    @pytest.mark.django_db
+    def test_header_and_metrics(self, settings, create_recipes):
+        settings.SERVER_TIMING_ENABLED = True
+        create_recipes(1)
+        client = APIClient()
+        response = client.get("/api/recipes/")
+        assert "db;dur=" in response["Server-Timing"]
+        assert "view;dur=" in response["Server-Timing"]
+        assert "render;dur=" in response["Server-Timing"]
+        response = client.get("/api/metrics/")
+        assert (
+            'foodgram_db_queries_count{route="api:recipes-list"}'
+            in response.content.decode()
+        )
+
+    def test_samples_are_merged_across_workers(self, settings, tmp_path):
+        env = {
+            **os.environ,
+            "PROMETHEUS_MULTIPROC_DIR": str(tmp_path),
+            "DJANGO_SETTINGS_MODULE": "foodgram.settings",
+        }
+        setup = "import django; django.setup(); "
+        observe = (
+            "from core.metrics import registry; "
+            "registry.observe('foodgram_db_queries', 'worker', 3)"
+        )
+        render = "from core.metrics import registry; print(registry.render())"
+        for script in (observe, observe, render):
+            result = subprocess.run(
+                (sys.executable, "-c", setup + script),
+                env=env,
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        assert 'foodgram_db_queries_count{route="worker"} 2.0' in result.stdout
+
+    @pytest.mark.django_db
+    def test_disabled(self, api_client):
+        response = api_client.get("/api/tags/")
+        assert "Server-Timing" not in response
+        assert api_client.get("/api/metrics/").status_code == 404
+
+
+class TestQueryShapes:
+    urls = (
+        "/api/tags/",
+        "/api/tags/{tag}/",
+        "/api/ingredients/",
+        "/api/ingredients/?name=мо",
+        "/api/ingredients/{ingredient}/",
+        "/api/recipes/",
+        "/api/recipes/?is_favorited=1&is_in_shopping_cart=1",
+        "/api/recipes/?tags=breakfast&tags=lunch",
+        "/api/recipes/{recipe}/",
+        "/api/recipes/shopping_list/",
+        "/api/users/",
+        "/api/users/{author}/",
+        "/api/users/me/",
+        "/api/users/subscriptions/",
+        "/api/recipes/trending/?tags=lunch",
+    )
+
+    @pytest.fixture
+    def populated(self, reader, author, django_user_model, create_recipes):
+        recipes = create_recipes(3)
+        for index in range(3):
+            user = django_user_model.objects.create_user(
+                email=f"user{index}@email.ru",
+                password="password",
+                username=f"user{index}",
+                first_name="user",
+                last_name="user",
+            )
+            recipes.extend(create_recipes(2, user=user))
+            Subscription.objects.create(user=reader, author=user)
+            CartItem.objects.create(
+                cart=Cart.objects.create(user=user), recipe=recipes[0]
+            )
+        Subscription.objects.create(user=reader, author=author)
+        cart = Cart.objects.create(user=reader)
+        for recipe in recipes:
+            FavoriteRecipe.objects.create(user=reader, recipe=recipe)
+            CartItem.objects.create(cart=cart, recipe=recipe)
+        return {
+            "tag": Tag.objects.first().id,
+            "ingredient": Ingredient.objects.first().id,
+            "recipe": recipes[0].id,
+            "author": author.id,
+        }
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize("url", urls)
+    def test_reader(self, populated, reader_client, n_plus_one, url):
+        response = reader_client.get(url.format(**populated))
+        assert response.status_code == 200
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize("url", urls[:9] + urls[10:12])
+    def test_anonymous(self, populated, api_client, n_plus_one, url):
+        response = api_client.get(url.format(**populated))
+        assert response.status_code == 200
+
+    @pytest.mark.django_db
+    def test_writes(self, populated, author, reader_client, n_plus_one):
+        recipe = populated["recipe"]
+        for action in ("favorite", "shopping_cart"):
+            url = f"/api/recipes/{recipe}/{action}/"
+            assert reader_client.delete(url).status_code == 204
+            assert reader_client.post(url).status_code == 200
+        url = f"/api/users/{author.id}/subscribe/"
+        assert reader_client.delete(url).status_code == 204
+        assert reader_client.post(url).status_code == 200
+
+    @pytest.mark.django_db
+    def test_recipe_writes(
+        self,
+        populated,
+        tags,
+        ingredients,
+        image,
+        media_root,
+        author_client,
+        n_plus_one,
+    ):
+        data = {
+            "name": "Омлет",
+            "text": "text",
+            "cooking_time": 10,
+            "image": image,
+            "tags": [tag.id for tag in tags],
+            "ingredients": [
+                {"id": ingredient.id, "amount": 1}
+                for ingredient in ingredients
+            ],
+        }
+        response = author_client.post("/api/recipes/", data, format="json")
+        assert response.status_code == 201
+        url = f"/api/recipes/{response.data['id']}/"
+        data["tags"] = [tags[0].id]
+        data["ingredients"] = [
+            {"id": ingredient.id, "amount": 2} for ingredient in ingredients
+        ]
+        assert author_client.put(url, data, format="json").status_code == 200
+        assert author_client.delete(url).status_code == 204
+        # Held in the carts of several users.
+        url = f"/api/recipes/{populated['recipe']}/"
+        assert author_client.delete(url).status_code == 204
+
+    @pytest.mark.django_db
+    def test_user_writes(self, populated, n_plus_one):
+        client = APIClient()
+        response = client.post(
+            "/api/users/",
+            {
+                "email": "new@email.ru",
+                "username": "new",
+                "first_name": "new",
+                "last_name": "new",
+                "password": "n3w-Passw0rd",
+            },
+        )
+        assert response.status_code == 201
+        response = client.post(
+            "/api/auth/token/login/",
+            {"email": "new@email.ru", "password": "n3w-Passw0rd"},
+        )
+        assert response.status_code == 200
+        client.credentials(
+            HTTP_AUTHORIZATION=f"Token {response.data['auth_token']}"
+        )
+        response = client.post(
+            "/api/users/set_password/",
+            {
+                "current_password": "n3w-Passw0rd",
+                "new_password": "An0ther-Passw0rd",
+            },
+        )
+        assert response.status_code == 204
+        assert client.post("/api/auth/token/logout/").status_code == 204
+
+    @pytest.mark.django_db
+    def test_reports_serializer_field(self, populated, reader):
+        request = APIRequestFactory().get("/api/recipes/")
+        request.user = reader
+        with QueryShapeDetector() as detector:
+            RecipeSerializer(
+                Recipe.objects.all(), many=True, context={"request": request}
+            ).data
+        assert "RecipeSerializer.tags" in detector.report()
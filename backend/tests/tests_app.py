@@ -1,6 +1,14 @@
+import io
+import json
+
 import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from app.models import Tag
+from app.models import Ingredient, Recipe, RecipeIngredient, Tag
+from core.bulk import BulkLoader
+from core.checks import check_shared_cache
 
 
 class TestTag:
@@ -28,3 +36,104 @@ class TestTag:
         finally:
             count_after_create = Tag.objects.count()
             assert count_before_create == count_after_create
+
+
+class TestImportCatalog:
+    @staticmethod
+    def write(path, names):
+        path.write_text(
+            "\n".join(
+                json.dumps({"name": name, "measurement_unit": "г"})
+                for name in names
+            ),
+            encoding="utf-8",
+        )
+
+    @staticmethod
+    def run(path):
+        stdout = io.StringIO()
+        call_command("importcatalog", path, stdout=stdout)
+        return stdout.getvalue()
+
+    @pytest.mark.django_db
+    def test_incremental_import(self, tmp_path):
+        path = tmp_path / "ingredients.ndjson"
+        self.write(path, ["Мука", "сахар"])
+        assert "2 из 2" in self.run(path)
+        assert "не изменился" in self.run(path)
+        self.write(path, ["Мука", "сахар", "соль"])
+        assert "1 из 3" in self.run(path)
+        self.write(path, ["Мука", "масло", "соль"])
+        assert "3 из 3" in self.run(path)
+        assert Ingredient.objects.count() == 4
+        assert Ingredient.objects.get(name="Мука").search_name == "мука"
+
+    @pytest.mark.django_db
+    def test_json_array(self, tmp_path):
+        path = tmp_path / "ingredients.json"
+        path.write_text(
+            '[{"name": "мука", "measurement_unit": "г"},\n'
+            ' {"name": "соль", "measurement_unit": "г"}]',
+            encoding="utf-8",
+        )
+        assert "2 из 2" in self.run(path)
+
+
+class TestUpdateDatabaseBulk:
+    @staticmethod
+    def run(*args):
+        stdout = io.StringIO()
+        call_command(
+            "updatedatabase", "--bulk", "--workers", "1", *args, stdout=stdout
+        )
+        return stdout.getvalue()
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize("args", [(), ("--copy",)])
+    def test_reload_reports_only_new_rows(self, settings, args):
+        # COPY needs PostgreSQL, elsewhere --copy falls back to bulk_create.
+        settings.PASSWORD_HASHERS = [
+            "django.contrib.auth.hashers.MD5PasswordHasher"
+        ]
+        output = self.run(*args)
+        recipes = Recipe.objects.count()
+        links = RecipeIngredient.objects.count()
+        assert recipes and links
+        assert f"app.Recipe: {recipes} rows" in output
+        assert f"app.RecipeIngredient: {links} rows" in output
+        output = self.run(*args)
+        assert Recipe.objects.count() == recipes
+        assert "app.Recipe: 0 rows" in output
+        assert f"{recipes} skipped" in output
+        assert "total: 0 rows" in output
+
+    @pytest.mark.django_db
+    def test_conflicts_are_resolved_per_batch(self):
+        loader = BulkLoader(stdout=io.StringIO(), batch_size=2)
+        tags = [
+            Tag(
+                id=number,
+                name=f"tag {number}",
+                color=f"#00000{number}",
+                slug=f"tag-{number}",
+            )
+            for number in range(1, 5)
+        ]
+        with CaptureQueriesContext(connection) as context:
+            assert loader.load(model=Tag, objects=tags[:2]) == [1, 2]
+        assert not any(
+            query["sql"].startswith("SELECT")
+            for query in context.captured_queries
+        )
+        assert loader.load(model=Tag, objects=tags) == [1, 2, 3, 4]
+        assert loader.timings["app.Tag"][:2] == (4, 2)
+
+
+class TestSharedCacheCheck:
+    def test_local_cache_with_several_workers(self, settings):
+        settings.WEB_CONCURRENCY = 5
+        assert [error.id for error in check_shared_cache(None)] == [
+            "core.E001"
+        ]
+        settings.WEB_CONCURRENCY = 1
+        assert check_shared_cache(None) == []
@@ -0,0 +1,36 @@
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+
+from app.models import Recipe
+
+
+class TestBenchmark:
+    @pytest.mark.django_db
+    def test_generate_and_benchmark(self, ingredients, tmp_path):
+        call_command(
+            "generatedata",
+            users=20,
+            recipes=50,
+            favorites=100,
+            cart_items=30,
+            subscriptions=40,
+            seed=1,
+            stdout=io.StringIO(),
+        )
+        assert Recipe.objects.count() == 50
+        output = tmp_path / "benchmark.json"
+        call_command(
+            "benchmarkapi",
+            iterations=2,
+            warmup=0,
+            output=output,
+            stdout=io.StringIO(),
+        )
+        results = json.loads(output.read_text())["results"]
+        assert all(
+            result["statuses"] in ([200], [201], [204], [200, 204])
+            for result in results.values()
+        ), results
@@ -0,0 +1,25 @@
+import io
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+from app.models import FavoriteRecipe
+from cart.models import Cart, CartItem
+from users.models import Subscription
+
+
+class TestExplainQueries:
+    @pytest.mark.django_db
+    def test_hot_queries_use_indexes(self, author, reader, create_recipes):
+        if connection.vendor != "sqlite":
+            pytest.skip("the planner prefers seq scans on tiny tables")
+        recipes = create_recipes(3)
+        Subscription.objects.create(user=reader, author=author)
+        cart = Cart.objects.create(user=reader)
+        for recipe in recipes:
+            FavoriteRecipe.objects.create(user=reader, recipe=recipe)
+            CartItem.objects.create(cart=cart, recipe=recipe)
+        output = io.StringIO()
+        call_command("explainqueries", min_rows=0, stdout=output)
+        assert "recipe_list: ok" in output.getvalue()
@@ -1,5 +1,13 @@
 import pytest
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
+from core.authentication import TokenCache, token_cache
+from core.bulk import PasswordHasherPool
+from core.cache import get_cache_stats
 from users.models import User
 
 
@@ -113,3 +121,108 @@ class TestUser:
         finally:
             count_before_create = User.objects.count()
             assert count_after_create == count_before_create
+
+
+class TestPasswordHasherPool:
+    def test_hash_passwords(self, test_password):
+        prehashed = make_password("prehashed")
+        with PasswordHasherPool(workers=2) as hasher:
+            hashed = hasher.hash([test_password, prehashed])
+        assert check_password(test_password, hashed[0])
+        assert hashed[1] == prehashed
+
+
+@pytest.mark.django_db
+class TestCachedTokenAuthentication:
+    @pytest.fixture(autouse=True)
+    def enable_token_cache(self, settings):
+        settings.TOKEN_CACHE_ENABLED = True
+
+    def login(self, user):
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
+
+    def token_queries(self, client):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get("/api/users/me/")
+        return response, [
+            query["sql"]
+            for query in context.captured_queries
+            if "authtoken_token" in query["sql"]
+        ]
+
+    def test_repeated_request_skips_token_lookup(self, create_user):
+        client = self.login(create_user())
+        hits = token_cache.stats()["hits"]
+        assert self.token_queries(client)[1]
+        response, queries = self.token_queries(client)
+        assert response.status_code == 200
+        assert not queries
+        # Counters reach the shared cache in batches, not on every hit.
+        assert get_cache_stats(namespace="token")["hit"] == hits
+        assert token_cache.stats()["hits"] == hits + 1
+
+    def test_logout_invalidates_token(self, create_user):
+        client = self.login(create_user())
+        self.token_queries(client)
+        assert client.post("/api/auth/token/logout/").status_code == 204
+        assert self.token_queries(client)[0].status_code == 401
+
+    def test_deactivation_invalidates_token(self, create_user):
+        user = create_user()
+        client = self.login(user)
+        self.token_queries(client)
+        user.is_active = False
+        user.save(update_fields=["is_active"])
+        assert self.token_queries(client)[0].status_code == 401
+
+    def test_password_change_invalidates_token(self, create_user):
+        client = self.login(create_user())
+        self.token_queries(client)
+        response = client.post(
+            "/api/users/set_password/",
+            {"current_password": "password", "new_password": "n3w-Passw0rd"},
+        )
+        assert response.status_code == 204
+        assert self.token_queries(client)[1]
+
+    def test_bulk_deactivation_invalidates_token(
+        self, create_user, django_user_model
+    ):
+        user = create_user()
+        client = self.login(user)
+        self.token_queries(client)
+        django_user_model.objects.filter(pk=user.pk).update(is_active=False)
+        assert self.token_queries(client)[0].status_code == 401
+
+    def test_invalidation_reaches_other_workers(self, create_user):
+        user = create_user()
+        token = Token.objects.create(user=user)
+        # Each worker has its own TokenCache, only the versions are shared.
+        worker, other_worker = (
+            TokenCache(maxsize=10, ttl=60),
+            TokenCache(maxsize=10, ttl=60),
+        )
+        worker.set(token.key, user, token, worker.version(token.key))
+        assert worker.get(token.key, worker.version(token.key)) is not None
+        other_worker.invalidate_user(user_id=user.id)
+        assert worker.get(token.key, worker.version(token.key)) is None
+
+    def test_revocation_during_lookup_is_not_cached(self, create_user):
+        user = create_user()
+        token = Token.objects.create(user=user)
+        version = token_cache.version(token.key)
+        # Logged out after the version was read, before the entry is stored.
+        token_cache.invalidate_user(user_id=user.id)
+        token_cache.set(token.key, user, token, version)
+        assert (
+            token_cache.get(token.key, token_cache.version(token.key)) is None
+        )
+
+    def test_disabled_without_shared_cache(self, settings, create_user):
+        settings.TOKEN_CACHE_ENABLED = False
+        client = self.login(create_user())
+        self.token_queries(client)
+        assert self.token_queries(client)[1]
@@ -5,6 +5,10 @@ from .models import Subscription, User
 
 
 class UserModelsAdmin(UserAdmin):
+    list_display = UserAdmin.list_display + (
+        "recipes_count",
+        "followers_count",
+    )
     list_filter = (
         "is_staff",
         "is_superuser",
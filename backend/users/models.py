@@ -2,12 +2,33 @@ from django.conf import settings
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
-from django.db import models
+from django.db import models, transaction
 
 from core.validators import not_me_in_username_validator
 
+# Fields that change whether a token authenticates the user.
+AUTH_FIELDS = {"password", "is_active", "is_staff", "is_superuser"}
 
-class CustomUserManager(BaseUserManager):
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """Drop cached tokens when a bulk update touches auth fields
+
+        QuerySet.update() sends no post_save, so the handler in
+        users.signals does not see these changes.
+        """
+        if AUTH_FIELDS.isdisjoint(kwargs):
+            return super().update(**kwargs)
+        from core.authentication import token_cache
+
+        with transaction.atomic(using=self.db):
+            user_ids = list(self.values_list("pk", flat=True))
+            rows = super().update(**kwargs)
+            token_cache.invalidate_users(user_ids)
+        return rows
+
+
+class CustomUserManager(BaseUserManager.from_queryset(UserQuerySet)):
     def create_user(
         self, email, password, first_name, last_name, username, **extra_fields
     ):
@@ -86,6 +107,13 @@ class User(AbstractUser):
         },
     )
 
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="Рецептов", default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name="Подписчиков", default=0, editable=False
+    )
+
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["first_name", "last_name", "username"]
 
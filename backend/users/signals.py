@@ -0,0 +1,48 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .models import Subscription, User
+from core.authentication import token_cache
+from core.cache import bump_version, invalidate_following_ids
+
+
+@receiver((post_save, post_delete), sender=Subscription)
+def invalidate_subscription_cache(sender, instance, **kwargs):
+    invalidate_following_ids(user_id=instance.user_id)
+
+
+@receiver(post_save, sender=Subscription)
+def increment_followers_count(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            followers_count=F("followers_count") + 1
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_followers_count(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id, followers_count__gt=0).update(
+        followers_count=F("followers_count") - 1
+    )
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token_cache(sender, instance, **kwargs):
+    token_cache.invalidate_tokens(keys=[instance.key])
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_cached_user(sender, instance, update_fields=None, **kwargs):
+    # Deactivation and password changes both go through User.save().
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    token_cache.invalidate_user(user_id=instance.id)
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_author_cache(sender, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    bump_version(namespace="recipes")
@@ -1,4 +1,6 @@
 pytest_plugins = [
     "backend.tests.fixtures.fixtures_user",
     "backend.tests.fixtures.fixtures_tags",
+    "backend.tests.fixtures.fixtures_recipes",
+    "backend.tests.fixtures.fixtures_queries",
 ]